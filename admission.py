@@ -0,0 +1,239 @@
+"""
+MAUZER AI — Admission control and priority scheduling
+Every request gets a priority class (voice > interactive > background) and a deadline. Scarce
+resources — upstream call slots, CPU preprocessing slots — are PrioritySlots: a semaphore that
+hands a freed slot to the most urgent waiter instead of the oldest, keeps a few slots for voice
+only and drops waiters whose deadline passed (the user has given up on them) before they cost
+anything. At the door, per-client token buckets cap request rates and a class with too many
+requests already inside gets an immediate 429.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+CLASSES = ("voice", "interactive", "background")  # Most urgent first
+RANK = {cls: rank for rank, cls in enumerate(CLASSES)}
+
+priority = ContextVar("priority", default="interactive")  # Class of the current request
+deadline = ContextVar("deadline", default=None)  # [time.monotonic() after which nobody waits for the reply]
+
+
+def current_deadline():
+    """The request's deadline, or None (no deadline, or its response has started — someone is reading it)"""
+    box = deadline.get()
+    return box[0] if box else None
+
+
+class Expired(Exception):
+    """The request's deadline passed while it waited for a slot — dropped unserved"""
+
+
+class PrioritySlots:
+    """asyncio.Semaphore(limit) with waiters woken by (class, arrival); `reserve` of the slots are voice-only"""
+
+    def __init__(self, limit, reserve=0, on_event=None):
+        self.limit = limit
+        self.reserve = min(reserve, limit - 1)
+        self.on_event = on_event or (lambda cls, outcome: None)
+        self.in_use = 0
+        self.waiters = []  # heap of (rank, seq, class, future); abandoned futures are skipped on wake
+        self.seq = itertools.count()
+        self.queued = dict.fromkeys(CLASSES, 0)
+        self.stats = {cls: {"granted": 0, "waited": 0, "expired": 0, "wait_seconds": 0.0,
+                            "max_wait_seconds": 0.0} for cls in CLASSES}
+
+    def _fits(self, cls):
+        return self.in_use < (self.limit if cls == CLASSES[0] else self.limit - self.reserve)
+
+    async def acquire(self, cls=None, until=None):
+        """Take a slot for class cls (default: the request's) before `until` (default: its deadline)"""
+        cls = cls or priority.get()
+        until = until if until is not None else current_deadline()
+        stats = self.stats[cls]
+        if until is not None and time.monotonic() >= until:
+            stats["expired"] += 1
+            self.on_event(cls, "expired")
+            raise Expired(f"{cls} request past its deadline")
+        while self.waiters and self.waiters[0][3].done():
+            heapq.heappop(self.waiters)
+        if self._fits(cls) and not (self.waiters and self.waiters[0][0] <= RANK[cls]):
+            self.in_use += 1
+            stats["granted"] += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (RANK[cls], next(self.seq), cls, future))
+        self.queued[cls] += 1
+        start = time.monotonic()
+        try:
+            done, _ = await asyncio.wait((future,), timeout=None if until is None else until - start)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # Handed a slot just as the caller went away
+            future.cancel()
+            raise
+        finally:
+            self.queued[cls] -= 1
+        waited = time.monotonic() - start
+        if not done:
+            future.cancel()
+            stats["expired"] += 1
+            self.on_event(cls, "expired")
+            raise Expired(f"{cls} request waited {waited:.1f}s for a slot — deadline passed")
+        stats["granted"] += 1
+        stats["waited"] += 1
+        stats["wait_seconds"] += waited
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+
+    def release(self):
+        self.in_use -= 1
+        while self.waiters:
+            rank, _, cls, future = self.waiters[0]
+            if future.done():
+                heapq.heappop(self.waiters)
+                continue
+            if not self._fits(cls):
+                break
+            heapq.heappop(self.waiters)
+            self.in_use += 1
+            future.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    def report(self):
+        return {
+            "limit": self.limit,
+            "reserved_for_voice": self.reserve,
+            "in_use": self.in_use,
+            "queued": dict(self.queued),
+            "classes": {cls: {"granted": s["granted"], "waited": s["waited"], "expired": s["expired"],
+                              "avg_wait_ms": round(s["wait_seconds"] / s["waited"] * 1000, 1) if s["waited"] else None,
+                              "max_wait_ms": round(s["max_wait_seconds"] * 1000, 1)}
+                        for cls, s in self.stats.items()},
+        }
+
+
+class RateLimiter:
+    """Token bucket per client: `rate` requests/s sustained, bursts up to `burst`. With a SharedStore
+    every worker counts into one fixed window of burst/rate seconds per client instead"""
+
+    def __init__(self, rate, burst, store=None, max_clients=10000):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.store = store
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()  # client -> (tokens, last refill), least recently seen first
+        self.stats = {"allowed": 0, "limited": 0}
+
+    def check(self, client):
+        """0 when the request may go, else seconds until the client has budget again (rate 0: no limit)"""
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        if self.store is not None:
+            window = self.burst / self.rate
+            slot = int(time.time() // window)
+            count = self.store.incr("rate", f"{client}:{slot}", ttl=window * 2)
+            wait = 0.0 if count <= self.burst else (slot + 1) * window - time.time()
+        else:
+            tokens, last = self.buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            self.buckets[client] = (tokens - 1 if not wait else tokens, now)
+            while len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        self.stats["limited" if wait else "allowed"] += 1
+        return wait
+
+    def report(self):
+        return {"rate": self.rate, "burst": self.burst, "clients": len(self.buckets),
+                "shared": self.store is not None, **self.stats}
+
+
+class AdmissionMiddleware:
+    """Classifies each request, applies the client's rate limit and the class's queue depth, and sets
+    the priority and deadline that PrioritySlots read further down.
+    classify(scope, headers) -> class; deadlines: class -> seconds a request may wait in total
+    (an X-Deadline-Ms header may shorten it); limits: class -> requests inside at once before 429."""
+
+    def __init__(self, app, classify, deadlines, limits=None, limiter=None, exempt=(), on_event=None):
+        self.app = app
+        self.classify = classify
+        self.deadlines = deadlines
+        self.limits = limits or {}
+        self.limiter = limiter
+        self.exempt = exempt  # Path prefixes never limited (health probes, metrics)
+        self.on_event = on_event or (lambda cls, outcome: None)
+        self.active = dict.fromkeys(CLASSES, 0)  # Requests of each class being served (queued or running)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or scope["path"].startswith(self.exempt):
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or ())
+        cls = self.classify(scope, headers)
+        if scope["type"] == "websocket":  # Long-lived: a class, no deadline or rate limit
+            token = priority.set(cls)
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                priority.reset(token)
+
+        if self.limiter is not None:
+            client = headers.get(b"x-client-id", b"").decode("latin-1")[:64] or (scope.get("client") or ("?",))[0]
+            if self.limiter.store is not None:  # A SQLite write that may wait on other workers' lock: off the loop
+                wait = await asyncio.to_thread(self.limiter.check, client)
+            else:
+                wait = self.limiter.check(client)
+            if wait:
+                self.on_event(cls, "rate_limited")
+                return await reject(send, 429, "Rate limit exceeded", wait)
+        if self.active[cls] >= self.limits.get(cls, float("inf")):
+            self.on_event(cls, "queue_full")
+            return await reject(send, 429, f"Server busy ({self.active[cls]} {cls} requests queued)", 1.0)
+        budget = deadline_budget(headers.get(b"x-deadline-ms"), self.deadlines.get(cls))
+        self.on_event(cls, "admitted")
+        box = [None if budget is None else time.monotonic() + budget]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                box[0] = None  # Streaming: later work in this response is awaited by a reader
+            await send(message)
+
+        tokens = priority.set(cls), deadline.set(box)
+        self.active[cls] += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.active[cls] -= 1
+            priority.reset(tokens[0])
+            deadline.reset(tokens[1])
+
+
+def deadline_budget(header, default):
+    """Seconds an X-Deadline-Ms value allows: finite, positive and no longer than the class default — else
+    the default (a client can hurry its own requests, not park them forever)"""
+    try:
+        budget = float(header) / 1000
+    except (TypeError, ValueError):
+        return default
+    if not math.isfinite(budget) or budget <= 0 or (default is not None and budget > default):
+        return default
+    return budget
+
+
+async def reject(send, status, message, retry_after):
+    body = json.dumps({"error": message}, ensure_ascii=False).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                            (b"retry-after", str(max(1, round(retry_after))).encode())]})
+    await send({"type": "http.response.body", "body": body})
@@ -2,20 +2,55 @@
 MAUZER AI Backend — GPT-4o Powered Brain
 Engine: OpenAI GPT-4o (vision + tool calling)
 STT: OpenAI Whisper API
-TTS: Edge TTS (free neural voice)
+TTS: OpenAI tts-1, Edge TTS (free neural voice) or an offline test engine — see tts_engines.py
 """
 import json
 import base64
+import inspect
 import io
 import os
+import time
+import uuid
+import asyncio
 import tempfile
-import edge_tts
-from openai import OpenAI
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import FileResponse
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
+import startup
+from startup import FirstResponseMiddleware, lazy
+from fastapi import FastAPI, UploadFile, File, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+from starlette.formparsers import MultiPartParser
+from tts_cache import TTSCache
+from sessions import IMAGE_TOKENS, SessionStore
+from command_cache import CommandCache
+from grounding import GROUNDED_TOOLS, Grounding
+from intent_router import IntentRouter
+from vision import VisionPreprocessor, analyze, sniff_mime, split_data_uri
+from vad import VoiceActivityDetector, pcm_to_wav
+import audio
+from audio import AudioPreprocessor
+from shared import SharedStore
+from singleflight import SingleFlight, StreamFlights
+from prompts import Prompts, TokenUsage, count_tokens, message_tokens
+from tts_engines import EdgeTTS, LocalTTS, OpenAITTS, in_order, pop_sentences, split_sentences
+from health import Readiness
+from admission import RANK, AdmissionMiddleware, PrioritySlots, RateLimiter
+import resilience
+from resilience import CircuitOpen, LatencyWindow, Policy
+import metrics
+from metrics import MetricsMiddleware, stage
+
+# Deferred until first use (startup.py): the server binds first, prewarm() finishes these in the background
+httpx = lazy("httpx", required=True)
+openai = lazy("openai", required=True)
+local_engine = lazy("local_engine", required=True)  # torch + transformers behind it
+startup.mark("imports")
 
 # ============================================================
 # CONFIG
@@ -24,6 +59,111 @@ API_KEY = os.environ.get("OPENAI_API_KEY", "")
 MODEL = "gpt-4o"
 WHISPER_MODEL = "whisper-1"
 TTS_VOICE = "ru-RU-DmitryNeural"  # Edge TTS neural voice (free)
+TTS_MODEL = "tts-1"
+OPENAI_TTS_VOICE = "onyx"  # Deep male bass
+
+# TTS engine — "openai" (tts-1), "edge" (free, TTS_VOICE) or "local" (offline tones, tests only); ?engine= overrides
+TTS_ENGINE = os.environ.get("MAUZER_TTS_ENGINE", "openai")
+TTS_WORKERS = int(os.environ.get("MAUZER_TTS_WORKERS", "4"))  # Sentences of one long /api/tts text synthesized at once (1 = in turn)
+
+# Inference engine — "openai" (API) or "local" (offline models on this machine, see local_engine.py)
+ENGINE = os.environ.get("MAUZER_ENGINE", "openai")
+LOCAL_CHAT_MODEL = os.environ.get("MAUZER_LOCAL_CHAT_MODEL", "Qwen/Qwen2.5-1.5B-Instruct")
+LOCAL_STT_MODEL = os.environ.get("MAUZER_LOCAL_STT_MODEL", "openai/whisper-small")
+LOCAL_BATCH = int(os.environ.get("MAUZER_LOCAL_BATCH", "4"))  # Callers sharing one generate() pass
+LOCAL_THREADS = int(os.environ.get("MAUZER_LOCAL_THREADS", "0")) or None
+LOCAL_BATCH_WINDOW = int(os.environ.get("MAUZER_LOCAL_BATCH_MS", "10")) / 1000  # Wait for more callers to batch
+
+# TTS cache — repeated phrases never hit the API twice
+TTS_CACHE_DIR = os.environ.get("MAUZER_TTS_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "mauzer-tts-cache")
+TTS_CACHE_DISK_MB = int(os.environ.get("MAUZER_TTS_CACHE_MB", "64"))
+TTS_CACHE_MEMORY_MB = int(os.environ.get("MAUZER_TTS_MEMORY_MB", "8"))
+
+# Upstream HTTP pool — one shared async client for every endpoint
+MAX_CONNECTIONS = int(os.environ.get("MAUZER_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE = int(os.environ.get("MAUZER_MAX_KEEPALIVE", "16"))
+KEEPALIVE_SECONDS = float(os.environ.get("MAUZER_KEEPALIVE_SECONDS", "30"))  # Idle pooled connections kept this long
+PREWARM_CONNECTIONS = int(os.environ.get("MAUZER_PREWARM_CONNECTIONS", "2"))  # Opened (TCP + TLS) right after startup
+MAX_CONCURRENCY = int(os.environ.get("MAUZER_MAX_CONCURRENCY", "24"))  # In-flight upstream calls
+COALESCE = os.environ.get("MAUZER_COALESCE", "1") != "0"  # Identical concurrent requests share one upstream call
+
+# Vision — screenshots are downscaled/recompressed for detail=low before upload
+VISION_PREPROCESS = os.environ.get("MAUZER_VISION_PREPROCESS", "1") != "0"
+VISION_FORMAT = os.environ.get("MAUZER_VISION_FORMAT", "JPEG")  # JPEG | WEBP
+VISION_QUALITY = 70
+
+# Server — WORKERS > 1 runs that many uvicorn processes on one port; sessions, the command cache,
+# TTS clips, agent tasks and voice turns are then shared through SQLite files in STATE_DIR
+HOST = os.environ.get("MAUZER_HOST", "127.0.0.1")
+PORT = int(os.environ.get("MAUZER_PORT", "8000"))
+WORKERS = int(os.environ.get("MAUZER_WORKERS", "1"))
+CPU_WORKERS = int(os.environ.get("MAUZER_CPU_WORKERS", "0"))  # Process pool for screenshot/audio preprocessing (0 = threads)
+STATE_DIR = os.environ.get("MAUZER_STATE_DIR") or os.path.join(tempfile.gettempdir(), "mauzer-state")
+SHARED_STATE = WORKERS > 1 or os.environ.get("MAUZER_SHARED_STATE", "0") != "0"
+
+# Sessions — server-side conversation history per session_id
+SESSION_TOKEN_BUDGET = int(os.environ.get("MAUZER_SESSION_TOKENS", "3000"))
+MAX_SESSIONS = int(os.environ.get("MAUZER_MAX_SESSIONS", "10000"))
+SESSION_DB = os.environ.get("MAUZER_SESSION_DB") or None  # SQLite file for persistence (optional)
+if SHARED_STATE and not SESSION_DB:
+    SESSION_DB = os.path.join(STATE_DIR, "sessions.db")
+SESSION_MAX_IMAGES = 2  # Screenshots kept in history
+SESSION_TTL = int(os.environ.get("MAUZER_SESSION_TTL", "86400"))  # Shared state: saved sessions idle this long are purged
+
+# Local intent router — simple browser commands never reach the model
+INTENT_ROUTER = os.environ.get("MAUZER_INTENT_ROUTER", "1") != "0"
+
+# Command cache — repeated navigation commands skip the model
+COMMAND_CACHE = os.environ.get("MAUZER_COMMAND_CACHE", "1") != "0"
+COMMAND_CACHE_TTL = int(os.environ.get("MAUZER_COMMAND_CACHE_TTL", "3600"))
+COMMAND_CACHE_THRESHOLD = float(os.environ.get("MAUZER_COMMAND_CACHE_THRESHOLD", "0.75"))
+
+# Page grounding — click/type targets matched against the browser's page snapshot, not a screenshot
+GROUNDING = os.environ.get("MAUZER_GROUNDING", "1") != "0"
+GROUNDING_TTL = int(os.environ.get("MAUZER_GROUNDING_TTL", "1800"))  # A tab left open goes stale
+GROUNDING_THRESHOLD = float(os.environ.get("MAUZER_GROUNDING_THRESHOLD", "0.6"))
+
+# Audio — uploads are resampled to 16 kHz mono, silence-trimmed and re-encoded before Whisper
+AUDIO_PREPROCESS = os.environ.get("MAUZER_AUDIO_PREPROCESS", "1") != "0"
+AUDIO_FORMAT = os.environ.get("MAUZER_AUDIO_FORMAT", "OPUS")  # OPUS | FLAC | WAV
+
+# Uploads up to this size stay in memory (Starlette spools bigger ones to a temp file)
+STT_MAX_MEMORY_UPLOAD = 25 * 1024 * 1024  # Whisper API limit
+MultiPartParser.spool_max_size = STT_MAX_MEMORY_UPLOAD
+
+# Observability — /metrics (Prometheus text format) and JSON request logs with request IDs
+metrics.enabled = os.environ.get("MAUZER_METRICS", "1") != "0"
+metrics.json_logs = os.environ.get("MAUZER_JSON_LOGS", "1") != "0"
+
+# Per-endpoint upstream timeouts (seconds)
+CHAT_TIMEOUT = 30.0
+STT_TIMEOUT = 30.0
+TTS_TIMEOUT = 20.0
+HEALTH_TIMEOUT = 5.0
+HEALTH_INTERVAL = float(os.environ.get("MAUZER_HEALTH_INTERVAL", "15"))  # Background engine probe (when idle)
+
+# Resilience — every upstream call gets a deadline (the timeouts above) and jittered retries of
+# transient errors; hedging races a second attempt once one runs past the recent p95 (costs extra calls)
+RETRIES = int(os.environ.get("MAUZER_RETRIES", "2"))
+HEDGE = os.environ.get("MAUZER_HEDGE", "0") != "0"
+FALLBACK_MODEL = os.environ.get("MAUZER_FALLBACK_MODEL", "gpt-4o-mini")  # Chat while the GPT-4o breaker is open ("" = off)
+
+# Admission — requests are voice > interactive > background (screenshots, agent steps); the upstream and
+# CPU slots go to the most urgent waiter, a few upstream slots are voice-only, a class with too many requests
+# inside gets 429 at once and requests still queued past their deadline (the class default, or a shorter
+# X-Deadline-Ms) are dropped
+PRIORITY = os.environ.get("MAUZER_PRIORITY", "1") != "0"  # 0 = one class, first come first served
+VOICE_RESERVE = int(os.environ.get("MAUZER_VOICE_RESERVE", "4"))  # Upstream slots only voice may take
+CPU_SLOTS = int(os.environ.get("MAUZER_CPU_SLOTS", "0")) or (os.cpu_count() or 1) + 1  # Concurrent preprocessing jobs
+QUEUE_LIMITS = {"voice": 256, "interactive": 256, "background": 64}  # Requests per class inside before 429
+DEADLINES = {"voice": 15.0, "interactive": 30.0, "background": 60.0}  # Seconds a caller waits for its reply
+RATE_LIMIT = float(os.environ.get("MAUZER_RATE_LIMIT", "0"))  # Requests/s per client (X-Client-Id or IP), 0 = off
+RATE_BURST = int(os.environ.get("MAUZER_RATE_BURST", "40"))
+
+# Prompt caching — system prompt + tools are frozen at startup so every call starts with the same
+# bytes (the provider caches that prefix); prompts over the token limit are refused before sending
+PROMPT_TOKEN_LIMIT = int(os.environ.get("MAUZER_PROMPT_TOKENS", "16000"))
+PROMPT_CACHE_KEY = os.environ.get("MAUZER_PROMPT_CACHE_KEY", "1") != "0"  # Send prompt_cache_key (routes to a warm cache)
 
 # ============================================================
 # SYSTEM PROMPT — Personality of MAUZER AI
@@ -45,6 +185,12 @@ SYSTEM_PROMPT = """Ты — МАУЗЕР, встроенный ИИ-агент 
 5. Отвечай КОРОТКО (1-3 предложения максимум), если не просят подробностей
 6. ВСЕ текстовые ответы на РУССКОМ языке"""
 
+AGENT_PROMPT = SYSTEM_PROMPT + """
+
+РЕЖИМ АГЕНТА:
+- Вызывай СРАЗУ ВСЕ инструменты, которые можно выполнить без нового взгляда на страницу — браузер выполнит их по порядку и пришлёт результаты одним сообщением
+- После результатов продолжай задачу. Когда всё сделано — ответь коротким текстом БЕЗ инструментов"""
+
 # ============================================================
 # TOOLS DEFINITIONS (OpenAI Function Calling)
 # ============================================================
@@ -152,154 +298,649 @@ TOOLS = [
     },
 ]
 
+prompts = Prompts(SYSTEM_PROMPT, AGENT_PROMPT, TOOLS, PROMPT_TOKEN_LIMIT)
+token_usage = TokenUsage()
+
 # ============================================================
 # APP SETUP
 # ============================================================
-app = FastAPI()
-app.add_middleware(
+@asynccontextmanager
+async def lifespan(app):
+    global cpu_pool
+    if CPU_WORKERS > 0:
+        cpu_pool = ProcessPoolExecutor(CPU_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    purger = asyncio.create_task(purge_shared()) if shared_store is not None else None
+    warmer = asyncio.create_task(prewarm())  # Starts the readiness prober once the deferred imports are in
+    startup.mark("serving")  # uvicorn binds the socket right after this
+    yield
+    warmer.cancel()
+    if purger is not None:
+        purger.cancel()
+    if cpu_pool is not None:
+        cpu_pool.shutdown(wait=False, cancel_futures=True)
+        cpu_pool = None
+    await readiness.stop()
+    await close_client()
+
+app = FastAPI(lifespan=lifespan)
+
+client = None  # Lazy init engine client (AsyncOpenAI with a shared pool, or LocalEngine)
+openai_client = None
+client_lock = threading.Lock()
+cpu_pool = None  # ProcessPoolExecutor while running with CPU_WORKERS
+shared_store = SharedStore(os.path.join(STATE_DIR, "state.db")) if SHARED_STATE else None
+
+
+def admission_event(cls, outcome):
+    metrics.ADMISSION.inc(cls, outcome)
+
+
+upstream_slots = PrioritySlots(MAX_CONCURRENCY, VOICE_RESERVE if PRIORITY else 0,
+                               on_event=admission_event)  # Caps concurrent upstream calls
+cpu_slots = PrioritySlots(CPU_SLOTS, on_event=admission_event)  # Screenshot/audio preprocessing jobs
+rate_limiter = RateLimiter(RATE_LIMIT, RATE_BURST, shared_store)
+
+PRIORITY_PATHS = {"/api/stt": "voice", "/api/voice": "voice", "/api/tts": "voice", "/ws/stt": "voice",
+                  "/api/chat/image": "background", "/api/agent": "background"}
+SCREENSHOT_BODY = 32 * 1024  # A bigger /api/chat body carries a screenshot
+
+
+def classify(scope, headers):
+    """Priority class: X-Priority header, else by endpoint (and body size for /api/chat)"""
+    if not PRIORITY:
+        return "interactive"
+    cls = headers.get(b"x-priority", b"").decode("latin-1").lower()
+    if cls in RANK:
+        return cls
+    cls = PRIORITY_PATHS.get(scope["path"])
+    if cls is not None:
+        return cls
+    size = headers.get(b"content-length", b"")
+    return "background" if size.isdigit() and int(size) > SCREENSHOT_BODY else "interactive"
+
+
+app.add_middleware(AdmissionMiddleware, classify=classify, deadlines=DEADLINES, limits=QUEUE_LIMITS,
+                   limiter=rate_limiter, exempt=("/health", "/metrics"), on_event=admission_event)
+app.add_middleware(  # Outside admission: its 429s carry CORS headers too, preflights are never limited
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(FirstResponseMiddleware, exempt=("/health", "/metrics"))
+app.add_middleware(MetricsMiddleware)  # Outermost: rejected requests are timed and logged too
+vision = VisionPreprocessor(fmt=VISION_FORMAT, quality=VISION_QUALITY)
+audio_prep = AudioPreprocessor(fmt=AUDIO_FORMAT)
+intent_router = IntentRouter()
+command_cache = CommandCache(ttl=COMMAND_CACHE_TTL, threshold=COMMAND_CACHE_THRESHOLD, store=shared_store)
+grounding = Grounding(ttl=GROUNDING_TTL, threshold=GROUNDING_THRESHOLD, store=shared_store)
+sessions = SessionStore(SESSION_TOKEN_BUDGET, MAX_SESSIONS, SESSION_DB, SESSION_MAX_IMAGES, shared=SHARED_STATE,
+                        ttl=SESSION_TTL)
+tts_cache = TTSCache(TTS_CACHE_DIR, TTS_CACHE_DISK_MB * 1024 * 1024, TTS_CACHE_MEMORY_MB * 1024 * 1024,
+                     shared=SHARED_STATE)
+chat_flights = SingleFlight()  # Sessionless text-only /api/chat
+speech_flights = SingleFlight()  # Voice pipeline sentences
+tts_streams = StreamFlights()  # /api/tts clips, streamed to every caller
+POLICIES = {
+    "chat": Policy(CHAT_TIMEOUT, RETRIES, hedge=HEDGE),
+    "chat_fallback": Policy(CHAT_TIMEOUT, RETRIES, hedge=HEDGE),
+    "stt": Policy(STT_TIMEOUT, RETRIES, hedge=HEDGE),
+    "tts": Policy(TTS_TIMEOUT, RETRIES, hedge=HEDGE),
+}
+latencies = {op: LatencyWindow() for op in POLICIES}  # Recent upstream latency per op (hedging threshold)
+
+
+@asynccontextmanager
+async def upstream(op):
+    """One upstream call: concurrency slot, in-flight gauge, latency stage, error counter, readiness outcome"""
+    readiness.begin(op)
+    ok, error = False, None
+    try:
+        async with upstream_slots:  # Most urgent class first; raises Expired past the request's deadline
+            metrics.UPSTREAM_CALLS.inc(op)
+            metrics.UPSTREAM_IN_FLIGHT.inc(op)
+            try:
+                with stage(op):
+                    yield
+                ok = True
+            except Exception as e:
+                error = e
+                metrics.UPSTREAM_ERRORS.inc(op, type(e).__name__)
+                metrics.log("upstream_error", level="error", op=op, error=f"{type(e).__name__}: {e}")
+                raise
+            finally:
+                metrics.UPSTREAM_IN_FLIGHT.dec(op)
+    finally:
+        readiness.end(op, ok, error)
+
+
+def upstream_event(op):
+    def emit(kind):
+        if kind == "retry":
+            metrics.UPSTREAM_RETRIES.inc(op)
+        elif kind == "timeout":  # A hung upstream: counts against the breaker like any other failure
+            error = asyncio.TimeoutError(f"{op} deadline of {POLICIES[op].timeout:g}s passed")
+            readiness.fail(op, error)
+            metrics.UPSTREAM_ERRORS.inc(op, "TimeoutError")
+            metrics.log("upstream_error", level="error", op=op, error=f"TimeoutError: {error}")
+        else:
+            metrics.UPSTREAM_EVENTS.inc(op, kind)
+    return emit
 
-client = None  # Lazy init OpenAI client
+
+async def call_upstream(op, make):
+    """await make() — one upstream call — with op's deadline, retries, hedging and breaker"""
+    async def attempt():
+        async with upstream(op):
+            return await make()
+    return await resilience.call(attempt, POLICIES[op], latencies[op], readiness.deps[op].breaker,
+                                 upstream_event(op), hedge=False if ENGINE == "local" else None)
+
+
+async def open_upstream(op, make):
+    """call_upstream() for streams: make(stack) opens the stream; returns (stack, stream) with the
+    upstream slot held until the caller closes the stack. Retries cover the time to the first byte only."""
+    async def attempt():
+        stack = AsyncExitStack()
+        await stack.enter_async_context(upstream(op))
+        try:
+            return stack, await make(stack)
+        except BaseException as e:
+            await stack.__aexit__(type(e), e, e.__traceback__)  # upstream() records the failure
+            raise
+    return await resilience.call(attempt, POLICIES[op], latencies[op], readiness.deps[op].breaker,
+                                 upstream_event(op), hedge=False)
+
+
+async def chat_model(run):
+    """run(op, model) against GPT-4o; while its circuit breaker is open, FALLBACK_MODEL answers instead"""
+    try:
+        return await run("chat", MODEL)
+    except CircuitOpen:
+        if not FALLBACK_MODEL or ENGINE == "local":
+            raise
+        metrics.UPSTREAM_EVENTS.inc("chat", "fallback")
+        print(f"[CHAT] GPT-4o circuit open — falling back to {FALLBACK_MODEL}")
+        return await run("chat_fallback", FALLBACK_MODEL)
 
 def get_client():
+    """Client for the configured engine — both expose chat.completions, audio.* and models.list"""
     global client
     if client is None:
-        key = API_KEY
-        if not key:
-            # Try loading from settings file
-            try:
-                settings_path = os.path.join(os.environ.get("APPDATA", ""), "mauzer-browser", "settings.json")
-                if os.path.exists(settings_path):
-                    with open(settings_path, "r") as f:
-                        settings = json.load(f)
-                        key = settings.get("aiApiKey", "")
-            except:
-                pass
-        if not key:
-            raise ValueError("OpenAI API key not configured! Set OPENAI_API_KEY env var or configure in browser settings.")
-        client = OpenAI(api_key=key)
+        if ENGINE == "local":
+            client = local_engine.LocalEngine(LOCAL_CHAT_MODEL, LOCAL_STT_MODEL, LOCAL_BATCH, LOCAL_THREADS,
+                                              speech=lambda: get_openai_client().audio.speech,
+                                              window=LOCAL_BATCH_WINDOW)
+        else:
+            client = get_openai_client()
     return client
 
+
+def api_key():
+    """OPENAI_API_KEY, else the key saved in the browser settings ("" when neither is set)"""
+    key = API_KEY
+    if not key:
+        # Try loading from settings file
+        try:
+            settings_path = os.path.join(os.environ.get("APPDATA", ""), "mauzer-browser", "settings.json")
+            if os.path.exists(settings_path):
+                with open(settings_path, "r") as f:
+                    settings = json.load(f)
+                    key = settings.get("aiApiKey", "")
+        except:
+            pass
+    return key
+
+
+def get_openai_client():
+    global openai_client
+    with client_lock:  # prewarm() builds it in a worker thread while a request may ask for it
+        if openai_client is None:
+            openai_client = new_openai_client()
+    return openai_client
+
+
+def new_openai_client():
+    key = api_key()
+    if not key:
+        raise ValueError("OpenAI API key not configured! Set OPENAI_API_KEY env var or configure in browser settings.")
+    return openai.AsyncOpenAI(
+        api_key=key,
+        http_client=openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE,
+                keepalive_expiry=KEEPALIVE_SECONDS,
+            ),
+            timeout=httpx.Timeout(CHAT_TIMEOUT, connect=5.0),
+            event_hooks={"request": [metrics.on_upstream_request]},
+        ),
+        max_retries=0,  # Retries happen in call_upstream() (jitter, deadline, breaker)
+    )
+
+async def close_client():
+    """Close the shared HTTP pool (called on shutdown)"""
+    global client, openai_client
+    if openai_client is not None:
+        await openai_client.close()
+    client = openai_client = None
+
+
+async def purge_shared(every=60.0):
+    """Drop expired shared-state rows now and then (every worker does it — it's idempotent)"""
+    while True:
+        await asyncio.sleep(every)
+        try:
+            await asyncio.to_thread(shared_store.purge)
+            await asyncio.to_thread(sessions.purge)
+        except Exception as e:
+            print(f"[STATE] Purge failed: {e}")
+
+
+async def probe_engine():
+    """Cheapest call that proves the engine answers (API key, network, local models importable)"""
+    await get_client().models.list(timeout=HEALTH_TIMEOUT)
+
+
+async def prewarm():
+    """Right after startup: finish the deferred imports this configuration uses, then open
+    PREWARM_CONNECTIONS pooled upstream connections (TCP + TLS) so the first command pays for neither"""
+    start = time.perf_counter()
+    uses_openai = ENGINE != "local" or TTS_ENGINE == "openai"
+    names = ["tiktoken"]
+    if uses_openai:
+        names.append("openai")
+    if ENGINE == "local":
+        names.append("local_engine")
+    if TTS_ENGINE == "edge":
+        names.append("edge_tts")
+    try:
+        await asyncio.to_thread(startup.load, *names)
+        await asyncio.to_thread(lambda: prompts.default.tokens + prompts.agent.tokens)  # Tokenizer vocabulary
+        if uses_openai and api_key():
+            await asyncio.to_thread(get_openai_client)  # SSL context + CA bundle off the loop too
+    except Exception as e:
+        print(f"[STARTUP] Prewarm failed: {e}")
+    readiness.start()  # Not sooner: its first probe would do all of the above on the event loop
+    try:
+        if openai_client is not None and PREWARM_CONNECTIONS:
+            await asyncio.gather(*(openai_client.models.list(timeout=HEALTH_TIMEOUT)
+                                   for _ in range(PREWARM_CONNECTIONS)))
+    except Exception as e:
+        print(f"[STARTUP] Connection prewarm failed: {e}")
+    startup.mark("prewarmed")
+    print(f"[STARTUP] Prewarmed in {time.perf_counter() - start:.2f}s ({', '.join(names)}"
+          f"{f' + {PREWARM_CONNECTIONS} connections' if openai_client is not None and PREWARM_CONNECTIONS else ''})")
+
+
+readiness = Readiness(probe_engine, deps=tuple(POLICIES), limit=MAX_CONCURRENCY, interval=HEALTH_INTERVAL, timeout=HEALTH_TIMEOUT)
+
+# TTS engines — /api/tts and /api/voice pick one by name (TTS_ENGINE by default)
+tts_engines = {
+    "openai": OpenAITTS(lambda: get_client().audio.speech, TTS_MODEL, OPENAI_TTS_VOICE, TTS_TIMEOUT,
+                        call=call_upstream, open_stream=open_upstream),
+    "edge": EdgeTTS(TTS_VOICE, call=call_upstream, open_stream=open_upstream),
+    "local": LocalTTS(),
+}
+
 # ============================================================
 # MODELS
 # ============================================================
-from typing import Optional
+from typing import List, Optional
 
 class ChatRequest(BaseModel):
     text: str
     vision_base64: Optional[str] = None
     system_prompt: Optional[str] = ""
+    session_id: Optional[str] = None  # Server-side history when set
+    page_id: Optional[str] = None  # Page snapshot sent to /api/page: click/type targets resolved against it
+
+
+class PageSnapshot(BaseModel):
+    page_id: str  # Chosen by the browser, new per navigation
+    url: str = ""
+    title: str = ""
+    elements: List[dict] = []  # Interactive elements in document order: {"id", "role", "text", "label"}
 
 # ============================================================
 # ENDPOINTS
 # ============================================================
 
+async def transcribe(content, filename="audio.wav", content_type="audio/wav"):
+    """Audio bytes -> text. Whisper takes the upload straight from memory — no temp file round trip"""
+    if AUDIO_PREPROCESS:
+        async with cpu_slots:
+            with stage("audio_prep"):
+                if cpu_pool is not None:
+                    start = time.perf_counter()
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        cpu_pool, audio.process, content, filename, content_type, audio_prep.fmt, audio_prep.trim)
+                    content, filename, content_type, info = audio_prep.account(
+                        content, result, time.perf_counter() - start)
+                else:
+                    content, filename, content_type, info = await asyncio.to_thread(
+                        audio_prep.prepare, content, filename, content_type)
+        print(f"[STT] Audio {info['container']}: {info['in_bytes']} -> {info['out_bytes']} bytes")
+    c = get_client()
+    transcription = await call_upstream("stt", lambda: c.audio.transcriptions.create(
+        model=WHISPER_MODEL,
+        file=(filename, content, content_type),
+        language="ru",
+        timeout=STT_TIMEOUT
+    ))
+    return transcription.text.strip()
+
+
 @app.post("/api/stt")
 async def stt_handler(audio: UploadFile = File(...)):
     """Transcribe audio using OpenAI Whisper API — perfect Russian recognition"""
     try:
         content = await audio.read()
         print(f"[STT] Received audio: {len(content)} bytes")
-        
-        # Save to temp file (Whisper API needs a file)
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        tmp.write(content)
-        tmp.close()
-        
-        try:
-            c = get_client()
-            with open(tmp.name, "rb") as audio_file:
-                transcription = c.audio.transcriptions.create(
-                    model=WHISPER_MODEL,
-                    file=audio_file,
-                    language="ru"
-                )
-            text = transcription.text.strip()
-            print(f"[STT] Transcribed: {text}")
-            return {"text": text}
-        finally:
-            os.unlink(tmp.name)
+        text = await transcribe(content, audio.filename or "audio.wav", audio.content_type or "audio/wav")
+        print(f"[STT] Transcribed: {text}")
+        return {"text": text}
             
     except Exception as e:
         print(f"[STT ERROR] {e}")
-        return {"text": ""}
+        return {"text": "", "error": str(e) or type(e).__name__}
 
 
 @app.get("/api/tts")
-async def tts_handler(text: str):
-    """Generate premium voice using OpenAI TTS (onyx = deep male bass)"""
+async def tts_handler(text: str, engine: Optional[str] = None):
+    """Speak text with the TTS engine (?engine=openai|edge|local, default TTS_ENGINE) as one MP3 stream.
+    Multi-sentence texts are synthesized sentence by sentence, TTS_WORKERS at a time, and played in order."""
+    tts = tts_engines.get(engine or TTS_ENGINE)
+    if tts is None:
+        return JSONResponse({"error": f"Unknown TTS engine: {engine}"}, status_code=400)
     try:
-        c = get_client()
-        response = c.audio.speech.create(
-            model="tts-1",
-            voice="onyx",
-            input=text
-        )
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        tmp_path = tmp.name
-        tmp.close()
-        response.stream_to_file(tmp_path)
-        return FileResponse(tmp_path, media_type="audio/mpeg", background=None)
+        sentences = split_sentences(text)
+        if len(sentences) > 1:
+            # Long text: each sentence is its own (cached) TTS call, the next ones run while the first plays
+            clips = in_order(sentences, lambda sentence: synthesize(sentence, "mp3", tts), TTS_WORKERS)
+            first = await anext(clips)
+            return StreamingResponse(tts_clips(first, clips), media_type="audio/mpeg")
+
+        key = TTSCache.key(text, *tts.cache_id, "mp3")
+        # Shared: a miss here looks for another worker's file on disk — off the event loop
+        hit = await asyncio.to_thread(tts_cache.get, key) if tts_cache.shared else tts_cache.get(key)
+        if isinstance(hit, bytes):
+            return Response(hit, media_type="audio/mpeg")
+        if hit is not None:
+            return FileResponse(hit, media_type="audio/mpeg")  # sendfile/pathsend when the server supports it
+
+        # Miss: relay upstream audio chunks as they arrive — callers asking for the same clip meanwhile
+        # (retries, other tabs) read the same upstream stream instead of starting their own
+        flight = tts_streams.join(key if COALESCE else uuid.uuid4().hex, lambda f: fetch_tts(key, text, f, tts))
+        await flight.ready.wait()
+        if flight.error is not None and not flight.chunks:
+            raise flight.error
+        return StreamingResponse(flight.read(), media_type="audio/mpeg")
     except Exception as e:
         print(f"[TTS ERROR] {e}")
-        return {"error": str(e)}
+        return JSONResponse({"error": str(e) or type(e).__name__}, status_code=503)
+
+
+async def tts_clips(first, clips):
+    """First sentence's audio, then the rest as they finish (MP3 frames concatenate into one stream)"""
+    try:
+        yield first
+        async for clip in clips:
+            yield clip
+    finally:
+        await clips.aclose()  # Client gone -> sentences not synthesized yet are cancelled
+
+
+async def fetch_tts(key, text, flight, tts):
+    """One streamed TTS call into a Broadcast; the full clip goes to the TTS cache"""
+    async for chunk in tts.stream(text, "mp3"):
+        flight.push(chunk)
+    flight.close()
+    await asyncio.to_thread(tts_cache.put, key, b"".join(flight.chunks))
+
+
+async def prepare_vision(req: ChatRequest, image=None):
+    """Screenshot (req.vision_base64 or raw image bytes) -> (mime, base64) ready for the model, or None"""
+    source = image if image is not None else req.vision_base64
+    if not source:
+        return None
+    if not VISION_PREPROCESS:
+        if isinstance(source, bytes):
+            return sniff_mime(source), base64.b64encode(source).decode("ascii")
+        mime, payload = split_data_uri(source)
+        return mime or "image/png", payload
+    start = time.perf_counter()
+    async with cpu_slots:
+        with stage("vision"):
+            if cpu_pool is not None:
+                mime, payload, info = await prepare_vision_pooled(source)
+            else:
+                mime, payload, info = await asyncio.to_thread(vision.prepare, source)
+    print(f"[VISION] {info['in_bytes']} -> {info['out_bytes'] or len(payload) * 3 // 4} bytes "
+          f"({info['dedup'] or 'encoded'}) in {(time.perf_counter() - start) * 1000:.0f}ms")
+    return mime, payload
+
+
+async def prepare_vision_pooled(source):
+    """vision.prepare() with the decode and re-encode in the process pool (no GIL contention)"""
+    found, raw, digest = await asyncio.to_thread(vision.lookup, source)
+    if found is not None:
+        return found
+    encoded = await asyncio.get_running_loop().run_in_executor(
+        cpu_pool, analyze, raw, vision.fmt, vision.quality, vision.max_side)
+    return vision.settle(raw, digest, encoded)
+
+
+def build_messages(req: ChatRequest, image=None, history=()):
+    """Frozen prefix (system prompt + tools) + session history + user turn (with optional screenshot)
+    for GPT-4o -> (prefix, messages, estimated prompt tokens); raises PromptTooLong"""
+    prefix = prompts.prefix(req.system_prompt)
+    messages = list(history)
+    
+    # User message — with optional vision
+    if image:
+        mime, img_data = image
+        user_content = [
+            {"type": "text", "text": req.text},
+            {
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:{mime};base64,{img_data}",
+                    "detail": "low"  # Fast processing, enough for UI understanding
+                }
+            }
+        ]
+        messages.append({"role": "user", "content": user_content})
+    else:
+        messages.append({"role": "user", "content": req.text})
+    messages, tokens = prompts.messages(prefix, messages)
+    return prefix, messages, tokens
+
+
+sdk_cache_key = None  # Does the installed SDK take prompt_cache_key? Checked on first use
+
+
+def cache_key(prefix):
+    """prompt_cache_key for calls starting with prefix (OpenAI routes them to the same cache) — left
+    out on SDKs older than the parameter, which would reject every call with a TypeError"""
+    global sdk_cache_key
+    if sdk_cache_key is None:
+        create = openai.resources.chat.completions.AsyncCompletions.create
+        sdk_cache_key = "prompt_cache_key" in inspect.signature(create).parameters
+        if not sdk_cache_key:
+            print(f"[PROMPT] openai {openai.__version__} predates prompt_cache_key — not sending it")
+    return prefix.key if PROMPT_CACHE_KEY and sdk_cache_key else openai.NOT_GIVEN
+
+
+def record_usage(usage, estimated=None, seconds=None):
+    metrics.record_usage(usage)
+    token_usage.record(usage, estimated, seconds)
 
 
 @app.post("/api/chat")
 async def chat_handler(req: ChatRequest):
     """GPT-4o with native vision + tool calling — the real deal"""
+    return await chat_reply(req)
+
+
+@app.post("/api/chat/image")
+async def chat_image_handler(request: Request, text: str = "", system_prompt: str = "",
+                             session_id: Optional[str] = None, page_id: Optional[str] = None):
+    """/api/chat with a binary screenshot instead of base64-in-JSON:
+    multipart/form-data (text, system_prompt, session_id, page_id, image) or a raw image body with ?text=..."""
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        text = form.get("text", text)
+        system_prompt = form.get("system_prompt", system_prompt)
+        session_id = form.get("session_id", session_id)
+        page_id = form.get("page_id", page_id)
+        upload = form.get("image")
+        image = await upload.read() if upload is not None else None
+    else:
+        image = await request.body()
+    req = ChatRequest(text=text, system_prompt=system_prompt, session_id=session_id, page_id=page_id)
+    return await chat_reply(req, image or None)
+
+
+@app.post("/api/page")
+async def page_handler(req: PageSnapshot):
+    """The browser's snapshot of a page, once per navigation: indexed so that click/type commands with
+    this page_id are grounded on its elements instead of a screenshot"""
+    page = await asyncio.to_thread(grounding.push, req.page_id, req.model_dump())
+    print(f"[PAGE] Indexed {len(page.elements)} elements: {page.url[:80]}")
+    return {"page_id": req.page_id, "elements": len(page.elements)}
+
+
+def model_cost(req: ChatRequest, screenshot):
+    """(prompt tokens, ms) a model call for req would have taken — what a locally grounded action saves"""
+    content = [{"type": "text", "text": req.text}] + ([{"type": "image_url"}] if screenshot else [])
+    tokens = prompts.prefix(req.system_prompt).tokens + message_tokens({"role": "user", "content": content})
+    calls, seconds = (sum(column) for column in zip(*token_usage.latency.values()))
+    return tokens, seconds / calls * 1000 if calls else 0.0
+
+
+async def indexed_page(page_id):
+    """The page's grounding index — with shared state a page pushed to another worker is read from
+    the store off the event loop"""
+    page = grounding.page(page_id)
+    if page is None and grounding.store is not None:
+        page = await asyncio.to_thread(grounding.load, page_id)
+    return page
+
+
+async def route_locally(req: ChatRequest, image=None):
+    """(tool calls from the local intent router or None when the model is needed, req, image, hinted).
+    On a page indexed via /api/page (req.page_id) click/type targets are looked up among its elements,
+    screenshot or not; when several are plausible the model gets them as text in place of the
+    screenshot (req and image come back replaced, hinted=True: the request is about that page, so it
+    must not be served from or shared with page-less requests)"""
+    screenshot = image is not None or bool(req.vision_base64)
+    page = await indexed_page(req.page_id) if GROUNDING and req.page_id else None
+    if not INTENT_ROUTER or req.system_prompt or (screenshot and page is None):
+        return None, req, image, False
+    with stage("router"):
+        routed = intent_router.route(req.text)
+    grounded = None
+    if routed and page is not None and routed[0]["name"] in GROUNDED_TOOLS:
+        with stage("grounding"):
+            call, hint = grounding.ground(page, routed[0])
+        if call is not None:
+            grounding.saved(*model_cost(req, screenshot))
+            grounded = [call]
+        elif hint is not None and screenshot:
+            grounding.saved(IMAGE_TOKENS - count_tokens(hint), screenshot=True)
+            print(f"[CHAT] Grounding: {routed[0]['name']} sent with page candidates instead of the screenshot")
+            return None, req.model_copy(update={"text": f"{req.text}\n\n{hint}", "vision_base64": None}), None, True
+    if screenshot or grounded:
+        routed = grounded  # With a screenshot only a grounded click/type skips the model
+    if routed:
+        print(f"[CHAT] Local intent: {routed[0]['name']}({routed[0]['args']})")
+    return routed, req, image, False
+
+
+async def remember_routed(session, req: ChatRequest, routed):
+    """Record a locally routed command in the session as if the model had made the call"""
+    await remember_turn(session, req, None, "", [
+        {"id": f"local_{uuid.uuid4().hex[:12]}", "name": call["name"],
+         "arguments": json.dumps(call["args"], ensure_ascii=False)}
+        for call in routed
+    ])
+
+
+async def chat_reply(req: ChatRequest, image=None):
+    """One GPT-4o turn -> {"text", "tool_calls"}, with history when req.session_id is set"""
+    routed, req, image, hinted = await route_locally(req, image)
+    if not req.session_id:
+        if routed:
+            return {"text": "", "tool_calls": routed}
+        # Plain text commands with the stock prompt can come from the command cache
+        cacheable = COMMAND_CACHE and not hinted and image is None and not req.vision_base64 and not req.system_prompt
+        if cacheable:
+            with stage("command_cache"):
+                shared = await asyncio.to_thread(command_cache.fetch, req.text) if command_cache.store else None
+                reply, tier = command_cache.get(req.text, shared)
+            if reply is not None:
+                print(f"[CHAT] Command cache hit ({tier}): {req.text[:80]}")
+                return reply
+
+        async def model_reply():
+            start = time.perf_counter()
+            reply = await chat_turn(req, image)
+            if cacheable and reply["tool_calls"]:  # Only actions are cached — banter should stay fresh
+                command_cache.put(req.text, reply, time.perf_counter() - start)
+                if command_cache.store is not None:
+                    await asyncio.to_thread(command_cache.share, req.text, reply)
+            return reply
+
+        if COALESCE and not hinted and image is None and not req.vision_base64:  # Same prompt in flight -> share its reply
+            return dict(await chat_flights.do((req.text, req.system_prompt or ""), model_reply))
+        return await model_reply()
+    async with sessions.locked(req.session_id) as session:
+        if routed:
+            await remember_routed(session, req, routed)
+            reply = {"text": "", "tool_calls": routed}
+        else:
+            reply = await chat_turn(req, image, session)
+    reply["session_id"] = session.id
+    return reply
+
+
+async def chat_turn(req: ChatRequest, image=None, session=None):
     try:
         c = get_client()
-        system = req.system_prompt if req.system_prompt else SYSTEM_PROMPT
-        
-        # Build messages
-        messages = [{"role": "system", "content": system}]
-        
-        # User message — with optional vision
-        if req.vision_base64:
-            # Strip data URI prefix
-            img_data = req.vision_base64
-            if "," in img_data:
-                img_data = img_data.split(",", 1)[1]
-            
-            user_content = [
-                {"type": "text", "text": req.text},
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/png;base64,{img_data}",
-                        "detail": "low"  # Fast processing, enough for UI understanding
-                    }
-                }
-            ]
-            messages.append({"role": "user", "content": user_content})
-        else:
-            messages.append({"role": "user", "content": req.text})
+        image = await prepare_vision(req, image)
+        prefix, messages, tokens = build_messages(req, image, session.messages() if session else ())
         
         # Call GPT-4o with tools
         print(f"[CHAT] Sending to GPT-4o: {req.text[:80]}...")
-        response = c.chat.completions.create(
-            model=MODEL,
+        start = time.perf_counter()
+        response = await chat_model(lambda op, model: call_upstream(op, lambda: c.chat.completions.create(
+            model=model,
             messages=messages,
-            tools=TOOLS,
+            tools=prefix.tools,
             tool_choice="auto",
             temperature=0.7,
-            max_tokens=512
-        )
+            max_tokens=512,
+            prompt_cache_key=cache_key(prefix),
+            timeout=CHAT_TIMEOUT
+        )))
+        record_usage(response.usage, tokens, time.perf_counter() - start)
         
         choice = response.choices[0]
+        # Only the first tool call reaches the browser, so only it goes into the history
+        await remember_turn(session, req, image, choice.message.content, [
+            {"id": tc.id, "name": tc.function.name, "arguments": tc.function.arguments}
+            for tc in (choice.message.tool_calls or [])[:1]
+        ])
         
         # Check if model wants to call tools
         if choice.message.tool_calls:
             # Return the FIRST tool call (GPT-4o usually calls one at a time for browser actions)
             tc = choice.message.tool_calls[0]
             tool_name = tc.function.name
-            tool_args = json.loads(tc.function.arguments)
+            with stage("tool_args"):
+                tool_args = json.loads(tc.function.arguments)
             
             # Also grab any text the model said alongside the tool call
             text_response = choice.message.content or ""
@@ -326,16 +967,683 @@ async def chat_handler(req: ChatRequest):
         return {"text": f"Ошибка: {str(e)}", "tool_calls": []}
 
 
-@app.get("/health")
-async def health():
-    """Check if OpenAI API is accessible"""
+async def remember_turn(session, req: ChatRequest, image, text, tool_calls):
+    """Append user turn + assistant reply (+ tool result stubs) to the session history"""
+    if session is None:
+        return
+    turn = [("user", req.text, image, None, None)]
+    calls = [
+        {"id": tc["id"], "type": "function", "function": {"name": tc["name"], "arguments": tc["arguments"]}}
+        for tc in tool_calls
+    ]
+    compact = json.dumps(calls, ensure_ascii=False, separators=(",", ":")) if calls else None
+    turn.append(("assistant", text or "", None, compact, None))
+    # The browser executes tools without reporting back; record them as done so the history stays valid
+    turn.extend(("tool", "done", None, None, call["id"]) for call in calls)
+    sessions.append(session, turn)
+    with stage("session_save"):
+        await asyncio.to_thread(sessions.save, session)
+
+
+@app.delete("/api/session/{session_id}")
+async def session_delete_handler(session_id: str):
+    """Forget a conversation"""
+    await sessions.drop(session_id)
+    return {"status": "ok"}
+
+
+def sse(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def parse_tool_args(arguments, final=False):
+    """Parsed args once the streamed JSON is complete, else None"""
+    if not arguments.strip():
+        return {} if final else None
+    try:
+        args = json.loads(arguments)
+    except json.JSONDecodeError:
+        return None
+    return args if isinstance(args, dict) else None
+
+
+async def chat_stream(req: ChatRequest):
+    """Stream GPT-4o output as (event, data): text deltas, each tool call as soon as its args parse, then done"""
+    routed, req, _, _ = await route_locally(req)
+    if routed:
+        if req.session_id:
+            async with sessions.locked(req.session_id) as session:
+                await remember_routed(session, req, routed)
+        for call in routed:
+            yield ("tool_call", call)
+        done = {"text": "", "tool_calls": routed}
+        if req.session_id:
+            done["session_id"] = req.session_id
+        yield ("done", done)
+        return
+    if not req.session_id:
+        async for item in chat_stream_turn(req):
+            yield item
+        return
+    async with sessions.locked(req.session_id) as session:
+        async for event, data in chat_stream_turn(req, session):
+            if event == "done":
+                data["session_id"] = session.id
+            yield event, data
+
+
+async def chat_stream_turn(req: ChatRequest, session=None):
+    text_parts = []
+    tool_calls = []
     try:
         c = get_client()
-        # Quick test
-        c.models.list()
-        return {"status": "ok", "model": MODEL}
+        image = await prepare_vision(req)
+        prefix, messages, tokens = build_messages(req, image, session.messages() if session else ())
+        print(f"[CHAT STREAM] Sending to GPT-4o: {req.text[:80]}...")
+        pending = {}  # tool call index -> {"id", "name", "arguments", "sent"}
+        
+        stack, stream = await chat_model(lambda op, model: open_upstream(op, lambda stack: c.chat.completions.create(
+            model=model,
+            messages=messages,
+            tools=prefix.tools,
+            tool_choice="auto",
+            temperature=0.7,
+            max_tokens=512,
+            stream=True,
+            stream_options={"include_usage": True},
+            prompt_cache_key=cache_key(prefix),
+            timeout=CHAT_TIMEOUT
+        )))
+        async with stack:
+            async for chunk in stream:
+                if not chunk.choices:
+                    record_usage(chunk.usage, tokens)  # Last chunk with include_usage
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    text_parts.append(delta.content)
+                    yield ("text", {"delta": delta.content})
+                
+                for tc in delta.tool_calls or []:
+                    call = pending.setdefault(tc.index, {"id": "", "name": "", "arguments": "", "sent": False})
+                    call["id"] = call["id"] or tc.id or ""
+                    if tc.function:
+                        call["name"] += tc.function.name or ""
+                        call["arguments"] += tc.function.arguments or ""
+                    if call["sent"] or not call["name"]:
+                        continue
+                    args = parse_tool_args(call["arguments"])
+                    if args is not None:
+                        call["sent"] = True
+                        tool_calls.append({"name": call["name"], "args": args})
+                        print(f"[CHAT STREAM] Tool call: {call['name']}({args})")
+                        yield ("tool_call", tool_calls[-1])
+        
+        # Tool calls whose args never parsed mid-stream (e.g. no-arg go_back)
+        for index in sorted(pending):
+            call = pending[index]
+            if call["sent"] or not call["name"]:
+                continue
+            args = parse_tool_args(call["arguments"], final=True)
+            if args is None:
+                print(f"[CHAT STREAM] Bad tool args: {call['name']}({call['arguments']})")
+                continue
+            tool_calls.append({"name": call["name"], "args": args})
+            yield ("tool_call", tool_calls[-1])
+        
+        await remember_turn(session, req, image, "".join(text_parts), [
+            {"id": call["id"] or f"call_{index}", "name": call["name"], "arguments": call["arguments"] or "{}"}
+            for index, call in sorted(pending.items()) if call["name"]
+        ])
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        print(f"[CHAT STREAM ERROR] {e}")
+        yield ("error", {"message": str(e)})
+    
+    yield ("done", {"text": "".join(text_parts), "tool_calls": tool_calls})
+
+
+@app.post("/api/chat/stream")
+async def chat_stream_handler(req: ChatRequest):
+    """Streaming /api/chat — events: text, tool_call, error, done"""
+    return StreamingResponse(
+        (sse(event, data) async for event, data in chat_stream(req)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ============================================================
+# AGENT LOOP — batched tool calls, results back in one follow-up
+# ============================================================
+MAX_AGENT_STEPS = 8  # Model round trips per task
+MAX_AGENT_TASKS = 256
+AGENT_TASK_TTL = 600  # Seconds a shared task waits for its next follow-up
+
+agent_tasks = OrderedDict()  # task_id -> AgentTask
+agent_stats = {"tasks": 0, "round_trips": 0, "tool_calls": 0, "elapsed": 0.0, "model_time": 0.0}
+
+
+class ToolResult(BaseModel):
+    id: str
+    content: str = "done"
+
+
+class AgentRequest(BaseModel):
+    text: str = ""  # Task (first call) or an optional note with the results
+    task_id: Optional[str] = None  # Set on follow-ups
+    tool_results: List[ToolResult] = []
+    vision_base64: Optional[str] = None
+
+
+class AgentTask:
+    __slots__ = ("id", "started", "round_trips", "tool_calls", "model_time", "pending")
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.round_trips = 0
+        self.tool_calls = 0
+        self.model_time = 0.0
+        self.pending = []  # Tool call ids waiting for results
+
+    def dump(self):
+        """JSON-able state for the shared store (start time as wall clock — other processes read it)"""
+        return {"id": self.id, "started": time.time() - (time.perf_counter() - self.started),
+                "round_trips": self.round_trips, "tool_calls": self.tool_calls,
+                "model_time": self.model_time, "pending": self.pending}
+
+    @classmethod
+    def restore(cls, state):
+        task = cls.__new__(cls)
+        task.id = state["id"]
+        task.started = time.perf_counter() - (time.time() - state["started"])
+        task.round_trips = state["round_trips"]
+        task.tool_calls = state["tool_calls"]
+        task.model_time = state["model_time"]
+        task.pending = state["pending"]
+        return task
+
+
+async def load_task(task_id):
+    """The task — from the shared store when workers share state (the last step may have run elsewhere)"""
+    if shared_store is not None:
+        state = await asyncio.to_thread(shared_store.get, "agent", task_id)
+        if state is None:
+            agent_tasks.pop(task_id, None)
+            return None
+        agent_tasks[task_id] = AgentTask.restore(state)
+        agent_tasks.move_to_end(task_id)
+    return agent_tasks.get(task_id)
+
+
+async def save_task(task):
+    if shared_store is not None:
+        await asyncio.to_thread(shared_store.put, "agent", task.id, task.dump(), ttl=AGENT_TASK_TTL)
+
+
+async def finish_task(task):
+    """Close a task, fold it into agent_stats, return its metrics"""
+    agent_tasks.pop(task.id, None)
+    await sessions.drop(task.id)
+    if shared_store is not None:
+        await asyncio.to_thread(shared_store.delete, "agent", task.id)
+    elapsed = time.perf_counter() - task.started
+    agent_stats["tasks"] += 1
+    agent_stats["round_trips"] += task.round_trips
+    agent_stats["tool_calls"] += task.tool_calls
+    agent_stats["elapsed"] += elapsed
+    agent_stats["model_time"] += task.model_time
+    return {
+        "round_trips": task.round_trips,
+        "tool_calls": task.tool_calls,
+        "elapsed_ms": round(elapsed * 1000),
+        "model_ms": round(task.model_time * 1000),
+    }
+
+
+@app.post("/api/agent")
+async def agent_handler(req: AgentRequest):
+    """Multi-step agent: every tool call of a step in one batch, all results back in one follow-up"""
+    if req.task_id:
+        task = await load_task(req.task_id)
+        if task is None:
+            return JSONResponse({"error": "Unknown task"}, status_code=404)
+    else:
+        task = AgentTask()
+        agent_tasks[task.id] = task
+        while len(agent_tasks) > MAX_AGENT_TASKS:
+            _, stale = agent_tasks.popitem(last=False)
+            # Shared: the task may still be live on another worker — AGENT_TASK_TTL and SESSION_TTL clean up
+            if shared_store is None:
+                await sessions.drop(stale.id)
+    
+    async with sessions.locked(task.id) as session:
+        try:
+            c = get_client()
+            image = await prepare_vision(ChatRequest(text=req.text, vision_base64=req.vision_base64))
+            if task.pending:
+                results = {r.id: r.content for r in req.tool_results}
+                sessions.extend(session, [
+                    ("tool", results.get(call_id, "not executed"), None, None, call_id) for call_id in task.pending
+                ])
+                task.pending = []
+                if image or req.text:
+                    sessions.append(session, [("user", req.text or "Скриншот после действий", image, None, None)])
+            else:
+                sessions.append(session, [("user", req.text, image, None, None)])
+            
+            print(f"[AGENT] Task {task.id} step {task.round_trips + 1}")
+            start = time.perf_counter()
+            messages, tokens = prompts.messages(prompts.agent, session.messages())
+            response = await chat_model(lambda op, model: call_upstream(op, lambda: c.chat.completions.create(
+                model=model,
+                messages=messages,
+                tools=prompts.agent.tools,
+                tool_choice="auto",
+                parallel_tool_calls=True,
+                temperature=0.7,
+                max_tokens=512,
+                prompt_cache_key=cache_key(prompts.agent),
+                timeout=CHAT_TIMEOUT
+            )))
+            task.model_time += time.perf_counter() - start
+            task.round_trips += 1
+            record_usage(response.usage, tokens, time.perf_counter() - start)
+            
+            message = response.choices[0].message
+            calls = message.tool_calls or []
+            compact = json.dumps([
+                {"id": tc.id, "type": "function", "function": {"name": tc.function.name, "arguments": tc.function.arguments}}
+                for tc in calls
+            ], ensure_ascii=False, separators=(",", ":")) if calls else None
+            sessions.extend(session, [("assistant", message.content or "", None, compact, None)])
+            task.pending = [tc.id for tc in calls]
+            task.tool_calls += len(calls)
+            with stage("session_save"):
+                await asyncio.to_thread(sessions.save, session)
+            
+            reply = {
+                "task_id": task.id,
+                "text": message.content or "",
+                "tool_calls": [
+                    {"id": tc.id, "name": tc.function.name, "args": parse_tool_args(tc.function.arguments, final=True) or {}}
+                    for tc in calls
+                ],
+                "done": not calls or task.round_trips >= MAX_AGENT_STEPS,
+            }
+            if reply["done"]:
+                reply["metrics"] = await finish_task(task)
+                print(f"[AGENT] Task {task.id} done: {reply['metrics']}")
+            else:
+                await save_task(task)
+            return reply
+        except Exception as e:
+            print(f"[AGENT ERROR] {e}")
+            return {"task_id": task.id, "text": f"Ошибка: {str(e)}", "tool_calls": [], "done": True,
+                    "metrics": await finish_task(task)}
+
+
+@app.get("/api/agent/stats")
+async def agent_stats_handler():
+    """Round trips and latency per completed agent task"""
+    n = agent_stats["tasks"] or 1
+    return {
+        "tasks_completed": agent_stats["tasks"],
+        "tasks_active": len(agent_tasks),
+        "avg_round_trips": round(agent_stats["round_trips"] / n, 2),
+        "avg_tool_calls": round(agent_stats["tool_calls"] / n, 2),
+        "avg_elapsed_ms": round(agent_stats["elapsed"] / n * 1000),
+        "avg_model_ms": round(agent_stats["model_time"] / n * 1000),
+    }
+
+
+# ============================================================
+# VOICE PIPELINE — chat stream -> sentences -> TTS audio stream
+# ============================================================
+TTS_AHEAD = 3  # Sentences synthesized ahead of the one being streamed
+AUDIO_FORMATS = {"mp3": "audio/mpeg", "opus": "audio/ogg"}
+
+voice_turns = OrderedDict()  # turn_id -> VoiceEvents
+MAX_VOICE_TURNS = 64
+VOICE_TURN_TTL = 600  # Seconds a shared turn's events stay readable by other workers
+VOICE_POLL = 0.05  # Shared event log polling interval
+
+
+class VoiceEvents(asyncio.Queue):
+    """Chat (event, data) of one voice turn. With shared state the events are also appended to the
+    store — text deltas a sentence at a time — so an /events request that lands on another worker
+    can follow the turn from there"""
+
+    def __init__(self, turn_id):
+        super().__init__()
+        self.turn_id = turn_id
+        self.unshared = []  # Events not in the store yet
+
+    async def publish(self, event, data, flush=False):
+        """Queue an event; the store gets what has piled up at a sentence end (flush) or any non-text event"""
+        self.put_nowait((event, data))
+        if shared_store is None:
+            return
+        self.unshared.append([event, data])
+        if flush or event != "text":
+            rows, self.unshared = self.unshared, []
+            await asyncio.to_thread(shared_store.extend, "voice", self.turn_id, rows, ttl=VOICE_TURN_TTL)
+
+
+class VoiceRequest(ChatRequest):
+    format: str = "mp3"  # mp3 | opus
+
+
+async def synthesize(text, fmt="mp3", tts=None):
+    """One TTS call -> audio bytes (through the TTS cache, shared with identical calls in flight)"""
+    tts = tts or tts_engines[TTS_ENGINE]
+    key = TTSCache.key(text, *tts.cache_id, fmt)
+    audio = await asyncio.to_thread(tts_cache.read, key)
+    if audio is not None:
+        return audio
+    if COALESCE:
+        return await speech_flights.do(key, lambda: fetch_speech(key, text, fmt, tts))
+    return await fetch_speech(key, text, fmt, tts)
+
+
+async def fetch_speech(key, text, fmt, tts):
+    audio = await tts.synthesize(text, fmt)
+    await asyncio.to_thread(tts_cache.put, key, audio)
+    return audio
+
+
+async def voice_audio(req: VoiceRequest, events: VoiceEvents):
+    """Run the chat stream, synthesize each sentence as soon as it completes, yield audio in order"""
+    clips = asyncio.Queue(maxsize=TTS_AHEAD)  # TTS tasks in sentence order, None = end
+
+    async def produce():
+        buffer = ""
+        done = False
+        try:
+            async for event, data in chat_stream(req):
+                done = done or event == "done"
+                if event != "text":
+                    await events.publish(event, data)
+                    continue
+                buffer += data["delta"]
+                sentences, buffer = pop_sentences(buffer)
+                await events.publish(event, data, flush=bool(sentences))
+                for sentence in sentences:
+                    await clips.put(asyncio.create_task(synthesize(sentence, req.format)))
+            if buffer.strip():
+                await clips.put(asyncio.create_task(synthesize(buffer.strip(), req.format)))
+        except Exception as e:
+            print(f"[VOICE ERROR] {e}")
+        finally:
+            if not done:  # Failed or cancelled (client gone) mid-reply: the /events reader must still get an end
+                await events.publish("error", {"message": "Voice turn ended before the reply was complete"})
+                await events.publish("done", {"text": "", "tool_calls": []})
+        await clips.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (task := await clips.get()) is not None:
+            try:
+                yield await task
+            except Exception as e:
+                print(f"[VOICE TTS ERROR] {e}")
+    finally:
+        producer.cancel()
+        while not clips.empty():
+            task = clips.get_nowait()
+            if task is not None:
+                task.cancel()
+
+
+@app.post("/api/voice")
+async def voice_handler(req: VoiceRequest):
+    """Chat + TTS in one go: audio for each sentence streams back as soon as it is synthesized.
+    Text and tool calls of the same turn: GET /api/voice/{X-Turn-Id}/events (SSE)"""
+    if req.format not in AUDIO_FORMATS or req.format not in tts_engines[TTS_ENGINE].formats:
+        return JSONResponse({"error": f"Unsupported format: {req.format}"}, status_code=400)
+    turn_id = uuid.uuid4().hex
+    events = VoiceEvents(turn_id)
+    voice_turns[turn_id] = events
+    if shared_store is not None:
+        await asyncio.to_thread(shared_store.put, "voice", turn_id, True, ttl=VOICE_TURN_TTL)
+    while len(voice_turns) > MAX_VOICE_TURNS:
+        voice_turns.popitem(last=False)
+    print(f"[VOICE] Turn {turn_id}: {req.text[:80]}...")
+    return StreamingResponse(
+        voice_audio(req, events),
+        media_type=AUDIO_FORMATS[req.format],
+        headers={"X-Turn-Id": turn_id, "Access-Control-Expose-Headers": "X-Turn-Id"}
+    )
+
+
+@app.get("/api/voice/{turn_id}/events")
+async def voice_events_handler(turn_id: str):
+    """SSE of the chat side of a voice turn — same events as /api/chat/stream"""
+    events = voice_turns.get(turn_id)
+    if events is None and (shared_store is None
+                           or await asyncio.to_thread(shared_store.get, "voice", turn_id) is None):
+        return JSONResponse({"error": "Unknown turn"}, status_code=404)
+
+    async def relay():
+        try:
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(events.get(), CHAT_TIMEOUT)  # Same idle limit as relay_shared
+                except asyncio.TimeoutError:
+                    return
+                yield sse(event, data)
+                if event == "done":
+                    return
+        finally:
+            voice_turns.pop(turn_id, None)
+
+    return StreamingResponse(
+        relay() if events is not None else relay_shared(turn_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def relay_shared(turn_id):
+    """SSE of a voice turn running in another worker, read from the shared event log"""
+    seq = 0
+    idle = 0.0
+    while idle < CHAT_TIMEOUT:
+        rows = await asyncio.to_thread(shared_store.read, "voice", turn_id, seq)
+        if not rows:
+            await asyncio.sleep(VOICE_POLL)
+            idle += VOICE_POLL
+            continue
+        idle = 0.0
+        for seq, (event, data) in rows:
+            yield sse(event, data)
+            if event == "done":
+                return
+
+
+# ============================================================
+# STREAMING STT — PCM frames over WebSocket, VAD, partials, chat hand-off
+# ============================================================
+PARTIAL_EVERY = 0.8  # Seconds of new speech between partial transcripts
+SAMPLE_RATES = (8000, 48000)  # Accepted ?sample_rate= range
+
+stt_stream_stats = {"utterances": 0, "dropped": 0, "partials": 0, "speculative_hits": 0, "speculative_misses": 0}
+
+
+@app.websocket("/ws/stt")
+async def stt_stream_handler(ws: WebSocket):
+    """Streaming STT. Query: sample_rate (16000), session_id, chat (1 = hand the final transcript to chat).
+    In: binary 16-bit mono PCM frames, text {"type": "end"} to close an utterance early.
+    Out: {"type": "speech_start" | "partial" | "final" | "chat", ...}"""
+    await ws.accept()
+    try:
+        rate = int(ws.query_params.get("sample_rate", "16000"))
+    except ValueError:
+        rate = 0
+    if not SAMPLE_RATES[0] <= rate <= SAMPLE_RATES[1]:
+        await ws.send_json({"type": "error", "message": f"sample_rate must be an integer from {SAMPLE_RATES[0]} "
+                                                        f"to {SAMPLE_RATES[1]}"})
+        await ws.close(code=1003)  # Unsupported data
+        return
+    session_id = ws.query_params.get("session_id") or None
+    hand_off = ws.query_params.get("chat", "1") != "0"
+    vad = VoiceActivityDetector(rate)
+    send_lock = asyncio.Lock()
+    tasks = set()
+    partial = None  # In-flight partial transcription
+    partial_at = 0  # Utterance bytes covered by the last partial
+    speculative = None  # (pcm, task) started at the first pause
+
+    async def send(message):
+        async with send_lock:
+            await ws.send_json(message)
+
+    def spawn(coro):
+        task = asyncio.create_task(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return task
+
+    async def send_partial(pcm):
+        try:
+            text = await transcribe(pcm_to_wav(pcm, rate))
+        except Exception as e:
+            print(f"[WS STT] Partial failed: {e}")
+            return
+        if text:
+            stt_stream_stats["partials"] += 1
+            await send({"type": "partial", "text": text})
+
+    async def finish(pcm):
+        nonlocal speculative
+        start = time.perf_counter()
+        if speculative is not None and speculative[0] == pcm:  # Nothing said since the pause
+            stt_stream_stats["speculative_hits"] += 1
+            task = speculative[1]
+        else:
+            if speculative is not None:
+                stt_stream_stats["speculative_misses"] += 1
+                speculative[1].cancel()
+            task = spawn(transcribe(pcm_to_wav(pcm, rate)))
+        speculative = None
+        try:
+            text = await task
+        except Exception as e:
+            print(f"[WS STT ERROR] {e}")
+            await send({"type": "error", "message": str(e)})
+            return
+        stt_stream_stats["utterances"] += 1
+        print(f"[WS STT] Final: {text}")
+        await send({"type": "final", "text": text, "audio_ms": round(len(pcm) / 2 / rate * 1000),
+                    "wait_ms": round((time.perf_counter() - start) * 1000)})
+        if hand_off and text:
+            async for event, data in chat_stream(ChatRequest(text=text, session_id=session_id)):
+                await send({"type": "chat", "event": event, "data": data})
+
+    def handle(event, pcm):
+        nonlocal partial, partial_at, speculative
+        if event == "start":
+            partial_at = 0
+            spawn(send({"type": "speech_start"}))
+        elif event == "pause":
+            if speculative is not None:  # Speech resumed after the previous pause
+                stt_stream_stats["speculative_misses"] += 1
+                speculative[1].cancel()
+            speculative = (pcm, spawn(transcribe(pcm_to_wav(pcm, rate))))
+        elif event == "drop":
+            stt_stream_stats["dropped"] += 1
+            if speculative is not None:
+                speculative[1].cancel()
+                speculative = None
+        elif event == "end":
+            if partial is not None:
+                partial.cancel()  # The final transcript supersedes it
+                partial = None
+            spawn(finish(pcm))
+
+    try:
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                for event, pcm in vad.feed(message["bytes"]):
+                    handle(event, pcm)
+                # Partial transcripts while the user keeps talking, one in flight at a time
+                spoken = len(vad.frames) * vad.frame_bytes
+                if vad.speaking and spoken - partial_at >= PARTIAL_EVERY * rate * 2 and (partial is None or partial.done()):
+                    partial_at = spoken
+                    partial = spawn(send_partial(b"".join(vad.frames)))
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = None
+                if not isinstance(control, dict):
+                    await send({"type": "error", "message": 'Text frames must be JSON like {"type": "end"}'})
+                    await ws.close(code=1003)
+                    return
+                if control.get("type") == "end":
+                    ended = vad.flush()
+                    if ended:
+                        handle(*ended)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in list(tasks):
+            task.cancel()
+
+
+@app.get("/metrics")
+async def metrics_handler():
+    """Prometheus scrape endpoint — latency histograms per endpoint and stage, tokens, upstream calls/errors/retries"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+LIVE = b'{"status":"ok"}'
+
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness: the process and its event loop answer — nothing else is checked"""
+    return Response(LIVE, media_type="application/json")
+
+
+@app.get("/health/ready")
+async def readiness_handler():
+    """Readiness from background state (never calls upstream): 200 ready, 503 starting/unavailable"""
+    ready, body = readiness.snapshot()
+    return Response(body, status_code=200 if ready else 503, media_type="application/json")
+
+
+@app.get("/health")
+async def health():
+    """Readiness plus every component's counters (from background state — no upstream call)"""
+    stats = {"engine": ENGINE, "tts_engine": TTS_ENGINE, "tts_cache": tts_cache.stats(), "sessions": sessions.stats(),
+             "command_cache": command_cache.report(), "intent_router": intent_router.stats,
+             "grounding": grounding.report(),
+             "stt_stream": stt_stream_stats, "audio": audio_prep.report(),
+             "coalescing": {"chat": chat_flights.report(), "tts": tts_streams.report(),
+                            "speech": speech_flights.report()},
+             "prompt": prompts.report(), "tokens": token_usage.report(),
+             "worker": os.getpid(), "workers": WORKERS, "cpu_workers": CPU_WORKERS,
+             "admission": {"upstream": upstream_slots.report(), "cpu": cpu_slots.report(),
+                           "rate_limit": rate_limiter.report()},
+             "startup": startup.report()}
+    if shared_store is not None:
+        stats["shared_state"] = await asyncio.to_thread(shared_store.stats)
+    if ENGINE == "local" and client is not None:
+        stats["local"] = client.stats()
+    ready = readiness.report()
+    if ready["status"] == "unavailable":
+        message = ready["engine"]["error"] or "Required dependency down: " + ", ".join(
+            name for name, dep in ready["dependencies"].items() if dep["status"] == "down")
+        return {"status": "error", "message": message, "readiness": ready, **stats}
+    return {"status": "ok", "model": LOCAL_CHAT_MODEL if ENGINE == "local" else MODEL, "readiness": ready, **stats}
+
+
+startup.mark("app")
 
 
 # ============================================================
@@ -344,19 +1652,32 @@ async def health():
 if __name__ == "__main__":
     print('=' * 50)
     print('  MAUZER AI SERVER (GPT-4o)')
-    print(f'  Model: {MODEL}')
-    print(f'  STT: {WHISPER_MODEL}')
-    print(f'  TTS: {TTS_VOICE} (Edge, free)')
-    print(f'  API: http://127.0.0.1:8000')
+    if ENGINE == "local":
+        print(f'  Model: {LOCAL_CHAT_MODEL} (local)')
+        print(f'  STT: {LOCAL_STT_MODEL} (local)')
+    else:
+        print(f'  Model: {MODEL}')
+        print(f'  STT: {WHISPER_MODEL}')
+    if TTS_ENGINE == "edge":
+        print(f'  TTS: {TTS_VOICE} (Edge, free)')
+    else:
+        print(f'  TTS: {TTS_MODEL} / {OPENAI_TTS_VOICE}' if TTS_ENGINE == "openai" else f'  TTS: {TTS_ENGINE}')
+    print(f'  API: http://{HOST}:{PORT}')
+    if WORKERS > 1 or CPU_WORKERS:
+        print(f'  Workers: {WORKERS} (state: {STATE_DIR}), CPU pool: {CPU_WORKERS or "threads"}')
     print('=' * 50)
     
     # Quick API key check
-    try:
-        c = get_client()
+    if api_key():  # The client itself is created after startup (prewarm) — the SDK import is deferred
         print("  [OK] OpenAI API key loaded")
-    except Exception as e:
+    else:
         print(f"  [WARN] API key not yet configured")
         print("  Set OPENAI_API_KEY env var or configure in browser settings")
         print("  Server will start anyway, key can be set later via /health endpoint")
     
-    uvicorn.run(app, host="127.0.0.1", port=8000, log_level="info")
+    if WORKERS > 1:
+        # Each worker process imports this module afresh and serves the same socket
+        uvicorn.run("ai_backend:app", host=HOST, port=PORT, workers=WORKERS, log_level="info",
+                    app_dir=os.path.dirname(os.path.abspath(__file__)))
+    else:
+        uvicorn.run(app, host=HOST, port=PORT, log_level="info")
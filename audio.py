@@ -0,0 +1,155 @@
+"""
+MAUZER AI — Audio preprocessing for Whisper
+Uploads are sniffed, decoded once, downmixed and resampled to 16 kHz mono (all Whisper looks at),
+silence is trimmed off both ends, and the result is re-encoded compactly (Ogg/Opus or FLAC).
+Formats libsndfile can't decode (WebM, MP4) go through untouched — Whisper takes those as is.
+"""
+import io
+import threading
+import time
+
+import numpy as np
+
+try:
+    import soundfile
+except ImportError:  # soundfile missing -> audio passes through untouched
+    soundfile = None
+
+try:
+    import librosa
+except ImportError:  # librosa missing -> built-in windowed-sinc resampler
+    librosa = None
+
+TARGET_RATE = 16000  # Whisper resamples everything to 16 kHz mono anyway
+FORMATS = {  # name -> (soundfile format, subtype, filename, MIME)
+    "OPUS": ("OGG", "OPUS", "audio.ogg", "audio/ogg"),
+    "FLAC": ("FLAC", "PCM_16", "audio.flac", "audio/flac"),
+    "WAV": ("WAV", "PCM_16", "audio.wav", "audio/wav"),
+}
+
+
+def sniff_audio(raw):
+    """(container, filename, MIME) from magic bytes — browsers mislabel uploads (unknown -> names None)"""
+    if raw[:4] == b"RIFF" and raw[8:12] == b"WAVE":
+        return "wav", "audio.wav", "audio/wav"
+    if raw.startswith(b"OggS"):
+        return "ogg", "audio.ogg", "audio/ogg"
+    if raw.startswith(b"fLaC"):
+        return "flac", "audio.flac", "audio/flac"
+    if raw.startswith(b"\x1a\x45\xdf\xa3"):
+        return "webm", "audio.webm", "audio/webm"
+    if raw[4:8] == b"ftyp":
+        return "mp4", "audio.m4a", "audio/mp4"
+    if raw.startswith(b"ID3") or raw[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "mp3", "audio.mp3", "audio/mpeg"
+    return "unknown", None, None
+
+
+def resample(samples, rate, target=TARGET_RATE):
+    """Band-limited resample: librosa when installed, else low-pass FIR + linear interpolation"""
+    if rate == target:
+        return samples
+    if librosa is not None:
+        return librosa.resample(samples, orig_sr=rate, target_sr=target)
+    if rate > target:  # Anti-alias: windowed sinc at the new Nyquist
+        cutoff = 0.9 * target / rate / 2
+        n = np.arange(-32, 33)
+        taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(len(n))
+        samples = np.convolve(samples, (taps / taps.sum()).astype(np.float32), mode="same")
+    positions = np.arange(int(len(samples) * target / rate)) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def trim_silence(samples, rate, frame_ms=20, threshold_db=-40.0, floor_db=-55.0, pad_ms=150):
+    """Cut leading/trailing frames quieter than threshold_db below the loudest frame (vectorized)"""
+    frame = rate * frame_ms // 1000
+    n = len(samples) // frame
+    if n == 0:
+        return samples
+    frames = samples[:n * frame].reshape(n, frame)
+    db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    voiced = np.flatnonzero(db > max(db.max() + threshold_db, floor_db))
+    if len(voiced) == 0:
+        return samples[:0]
+    pad = pad_ms // frame_ms
+    first = max(0, voiced[0] - pad) * frame
+    last = min(n, voiced[-1] + 1 + pad) * frame
+    return samples[first:last]
+
+
+def process(raw, filename="audio.wav", mime="audio/wav", fmt="OPUS", trim=True):
+    """Uploaded bytes -> (bytes, filename, MIME, info). Pure and picklable — runs in a thread or a process pool."""
+    container, sniffed_name, sniffed_mime = sniff_audio(raw)
+    if sniffed_name:
+        filename, mime = sniffed_name, sniffed_mime
+    info = {"container": container, "in_bytes": len(raw), "out_bytes": len(raw), "seconds": None,
+            "passthrough": True}
+    samples = None
+    if soundfile is not None and container not in ("webm", "mp4"):
+        try:
+            samples, rate = soundfile.read(io.BytesIO(raw), dtype="float32", always_2d=True)
+        except Exception:
+            samples = None
+    if samples is None:
+        return raw, filename, mime, info
+
+    seconds = len(samples) / rate
+    mono = resample(samples.mean(axis=1), rate)
+    if trim:
+        mono = trim_silence(mono, TARGET_RATE)
+    if len(mono) == 0:  # Nothing but silence — keep a short clip so Whisper returns ""
+        mono = np.zeros(TARGET_RATE // 10, dtype=np.float32)
+    mono = np.clip(mono, -1.0, 1.0)
+    try:
+        encoded, out_name, out_mime = AudioPreprocessor._encode(mono, fmt)
+    except Exception:  # libsndfile built without Opus
+        encoded, out_name, out_mime = AudioPreprocessor._encode(mono, "FLAC")
+    info["seconds"] = round(seconds, 3)
+    info["trimmed_seconds"] = round(seconds - len(mono) / TARGET_RATE, 3)
+    if len(encoded) >= len(raw):  # Already compact (e.g. a short Opus clip) — keep the original
+        return raw, filename, mime, info
+    info["out_bytes"] = len(encoded)
+    info["passthrough"] = False
+    return encoded, out_name, out_mime, info
+
+
+class AudioPreprocessor:
+    def __init__(self, fmt="OPUS", trim=True):
+        self.fmt = fmt if fmt in FORMATS else "FLAC"
+        self.trim = trim
+        self.lock = threading.Lock()
+        self.stats = {"clips": 0, "passthrough": 0, "bytes_in": 0, "bytes_out": 0,
+                      "audio_seconds": 0.0, "trimmed_seconds": 0.0, "process_seconds": 0.0}
+
+    def prepare(self, raw, filename="audio.wav", mime="audio/wav"):
+        """Uploaded bytes -> (bytes, filename, MIME, info). Blocking — run in a thread."""
+        start = time.perf_counter()
+        return self.account(raw, process(raw, filename, mime, self.fmt, self.trim), time.perf_counter() - start)
+
+    def account(self, raw, result, elapsed):
+        """Count a process() result (computed here or in a process pool) into the stats; returns it"""
+        out, _, _, info = result
+        with self.lock:
+            self.stats["clips"] += 1
+            self.stats["passthrough"] += info["passthrough"]
+            self.stats["bytes_in"] += len(raw)
+            self.stats["bytes_out"] += len(out)
+            self.stats["audio_seconds"] += info["seconds"] or 0.0
+            self.stats["trimmed_seconds"] += 0.0 if info["passthrough"] else info["trimmed_seconds"]
+            self.stats["process_seconds"] += elapsed
+        return result
+
+    @staticmethod
+    def _encode(mono, fmt):
+        out_fmt, subtype, name, mime = FORMATS[fmt]
+        buf = io.BytesIO()
+        soundfile.write(buf, mono, TARGET_RATE, format=out_fmt, subtype=subtype)
+        return buf.getvalue(), name, mime
+
+    def report(self):
+        with self.lock:
+            s = dict(self.stats)
+        return {
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in s.items()},
+            "ms_per_audio_second": round(s["process_seconds"] * 1000 / s["audio_seconds"], 2) if s["audio_seconds"] else 0.0,
+        }
@@ -0,0 +1,153 @@
+"""
+MAUZER AI — Command cache
+Repeated voice commands ("открой ютуб", "найди погоду") skip GPT-4o entirely.
+Two tiers: exact match on normalized text, then a character-trigram similarity index.
+Entries expire after a TTL and are evicted least-recently-used. With a SharedStore, exact entries
+are also written there, so a command one worker process learned is an exact hit in all of them.
+"""
+import copy
+import re
+import time
+from collections import Counter, OrderedDict
+
+FILLER = {
+    "пожалуйста", "плиз", "please", "ну", "а", "давай", "ка", "мне", "бро", "братан",
+    "слушай", "короче", "быстро", "быстрее", "эй", "маузер", "mauzer",
+}
+WORD = re.compile(r"[a-zа-я0-9]+")
+
+
+def normalize(text):
+    """Lowercase, ё->е, drop punctuation and filler words"""
+    words = WORD.findall(text.lower().replace("ё", "е"))
+    return " ".join(w for w in words if w not in FILLER)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def exact_word(word):
+    """Numbers and words under 3 letters carry too few trigrams for fuzzy matching"""
+    return len(word) < 3 or any(c.isdigit() for c in word)
+
+
+class CommandCache:
+    def __init__(self, ttl=3600, max_entries=2048, threshold=0.75, token_threshold=0.4, store=None):
+        self.ttl = ttl
+        self.store = store  # shared.SharedStore of other worker processes, or None
+        self.max_entries = max_entries
+        self.threshold = threshold  # Whole-command trigram Jaccard for a similarity hit
+        self.token_threshold = token_threshold  # Every content word must match a word of the other command
+        self.entries = OrderedDict()  # normalized text -> (reply, expires, grams, words)
+        self.index = {}  # trigram -> set of normalized texts
+        self.stats = {"hits_exact": 0, "hits_similar": 0, "hits_shared": 0, "misses": 0, "evictions": 0,
+                      "saved_ms": 0.0}
+        self.miss_ms = 0.0  # Running average model latency of misses
+
+    def fetch(self, text):
+        """The shared store's entry for text, for get() (blocking — run off the event loop)"""
+        key = normalize(text)
+        return self.store.get("command", key) if self.store is not None and key else None
+
+    def get(self, text, shared=None):
+        """Cached reply (deep copy) and tier ('exact' | 'similar'), or (None, None).
+        shared: what fetch() returned for text, used when this process has no exact entry"""
+        key = normalize(text)
+        now = time.time()
+        tier = "exact"
+        entry = self.entries.get(key)
+        if entry is None and shared is not None and key:  # Learned by another worker
+            self.stats["hits_shared"] += 1
+            self._insert(key, shared[0], shared[1])
+            entry = self.entries[key]
+        if entry is None:
+            tier = "similar"
+            key, entry = self._nearest(key)
+        if entry is not None and entry[1] < now:
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            return None, None
+        self.entries.move_to_end(key)
+        self.stats["hits_" + tier] += 1
+        self.stats["saved_ms"] += self.miss_ms
+        return copy.deepcopy(entry[0]), tier
+
+    def put(self, text, reply, latency=None):
+        key = normalize(text)
+        if not key:
+            return
+        if latency is not None:  # Exponential moving average of what a miss costs
+            self.miss_ms = latency * 1000 if not self.miss_ms else 0.8 * self.miss_ms + 0.2 * latency * 1000
+        self._insert(key, copy.deepcopy(reply), time.time() + self.ttl)
+
+    def share(self, text, reply):
+        """Write an entry to the shared store for the other workers (blocking — run off the event loop)"""
+        key = normalize(text)
+        if self.store is not None and key:
+            self.store.put("command", key, [reply, time.time() + self.ttl], ttl=self.ttl)
+
+    def _insert(self, key, reply, expires):
+        if key in self.entries:
+            self._remove(key)
+        grams = trigrams(key)
+        self.entries[key] = (reply, expires, grams, tuple(key.split()))
+        for g in grams:
+            self.index.setdefault(g, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+
+    def _nearest(self, key):
+        grams = trigrams(key)
+        shared = Counter()
+        for g in grams:
+            shared.update(self.index.get(g, ()))
+        best, best_score = None, self.threshold
+        for candidate, n in shared.items():
+            other = self.entries[candidate][2]
+            score = n / (len(grams) + len(other) - n)
+            if score >= best_score and self._words_align(key.split(), self.entries[candidate][3]):
+                best, best_score = candidate, score
+        return (best, self.entries[best]) if best else (None, None)
+
+    def _words_align(self, a, b):
+        """Both ways, every word of 3+ letters has a close word on the other side ('ютуб' ~ 'ютубе', not
+        'москве' ~ 'алматы'); numbers and shorter words must match exactly ('iphone 15' is not 'iphone 16')"""
+        if sorted(w for w in a if exact_word(w)) != sorted(w for w in b if exact_word(w)):
+            return False
+        ga = [trigrams(w) for w in a if not exact_word(w)]
+        gb = [trigrams(w) for w in b if not exact_word(w)]
+        return (all(any(jaccard(x, y) >= self.token_threshold for y in gb) for x in ga)
+                and all(any(jaccard(x, y) >= self.token_threshold for x in ga) for y in gb))
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for g in entry[2]:
+            keys = self.index.get(g)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.index[g]
+
+    def report(self):
+        lookups = self.stats["hits_exact"] + self.stats["hits_similar"] + self.stats["misses"]
+        hits = lookups - self.stats["misses"]
+        return {
+            **self.stats,
+            "saved_ms": round(self.stats["saved_ms"]),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self.entries),
+        }
@@ -0,0 +1,341 @@
+"""
+MAUZER AI — Fake OpenAI server
+Local stand-in for api.openai.com used by the benchmarks: chat, Whisper, TTS, models.
+Answers are deterministic, latency is configurable via LATENCY, faults via FAULTS / CHAOS / OUTAGE.
+Chat usage reports prompt caching like the real API: a repeated prompt prefix counts as cached tokens.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Seconds of simulated upstream work per endpoint
+LATENCY = {
+    "chat": 0.2,
+    "first_token": 0.1,  # Streaming: delay before the first chunk
+    "chunk": 0.02,       # Streaming: delay between chunks
+    "stt": 0.2,
+    "tts": 0.2,
+    "tts_per_char": 0.002,  # TTS time grows with input length
+    "models": 0.05,
+    "prefill_per_token": 0.0,  # Chat: extra time per uncached prompt token
+    "uplink_mbps": 0,  # >0: simulate client->OpenAI upload bandwidth for request bodies
+}
+
+# Fault injection: the next N calls per endpoint fail with 503 (the SDK retries those)
+FAULTS = {"chat": 0, "stt": 0, "tts": 0}
+
+# Chaos for chat/STT/TTS, seeded so runs repeat: share of calls failing with 503 or answering slowly
+CHAOS = {"error_rate": 0.0, "slow_rate": 0.0, "slow_delay": 1.5}
+OUTAGE = set()  # Chat models that always fail with 503
+chaos_rng = random.Random(7)
+
+# Upstream call counters (reset with reset_stats())
+STATS = {"chat": 0, "chat_bytes": 0, "stt": 0, "stt_bytes": 0, "tts": 0, "models": 0}
+MODEL_CALLS = {}  # Chat model -> calls
+CHAT_MESSAGES = []  # Messages sent with each chat call, in arrival order
+
+# Prompt cache: hashes of prompt prefixes seen, in 128-token blocks from 1024 tokens on (~3 chars per token)
+PREFIX_MIN_CHARS = 1024 * 3
+PREFIX_BLOCK_CHARS = 128 * 3
+prefix_cache = set()
+
+app = FastAPI()
+
+
+def reset_stats():
+    for k in STATS:
+        STATS[k] = 0
+    MODEL_CALLS.clear()
+    CHAT_MESSAGES.clear()
+
+
+def injected_fault(endpoint):
+    """503 response while FAULTS[endpoint] > 0, else None"""
+    if FAULTS[endpoint] <= 0:
+        return None
+    FAULTS[endpoint] -= 1
+    return JSONResponse({"error": {"message": "Injected fault", "type": "server_error"}}, status_code=503)
+
+
+def chaos(model=None):
+    """(503 response or None, extra delay in seconds) for one call under CHAOS / OUTAGE"""
+    if model in OUTAGE or chaos_rng.random() < CHAOS["error_rate"]:
+        return JSONResponse({"error": {"message": "Chaos fault", "type": "server_error"}}, status_code=503), 0.0
+    return None, CHAOS["slow_delay"] if chaos_rng.random() < CHAOS["slow_rate"] else 0.0
+
+
+def _last_user_text(messages):
+    for m in reversed(messages):
+        if m.get("role") != "user":
+            continue
+        content = m.get("content")
+        if isinstance(content, list):
+            return " ".join(p.get("text", "") for p in content if p.get("type") == "text")
+        return content or ""
+    return ""
+
+
+def scripted_reply(text):
+    """Pick a deterministic (content, tool_calls) pair for a user message"""
+    low = text.lower()
+    if "ютуб" in low or "youtube" in low:
+        return "Открываю твой ютубчик, опять котиков смотреть будешь, да?", [
+            ("open_website", {"url": "https://youtube.com"}),
+        ]
+    if low.startswith("открой") and ("гугл" in low or "google" in low):
+        return "Гугл открыл, дальше сам.", [("open_website", {"url": "https://google.com"})]
+    if "расскажи" in low:
+        return (
+            "Ну слушай, раз уж так хочется. Браузеры появились в начале девяностых, и первым был WorldWideWeb. "
+            "Потом пришёл Mosaic, за ним Netscape, и понеслось. Internet Explorer задушил всех на десять лет. "
+            "Потом Firefox и Chrome вернули конкуренцию. А теперь есть я, и остальные можно удалять, блять."
+        ), []
+    if "найди" in low or "загугли" in low:
+        query = text.split(" ", 1)[1] if " " in text else text
+        return "", [("google_search", {"query": query})]
+    return "Ок, слушаю тебя, кожаный. Чего надо? Давай быстрее, у меня перекур.", []
+
+
+# Multi-step tasks: trigger phrase -> batches of tool calls the model makes, one batch per step
+PLANS = {
+    "второе видео": [
+        [("search_youtube", {"query": "котики"}), ("scroll", {"direction": "down"})],
+        [("click_text", {"text": "Котики 2"})],
+    ],
+}
+
+
+def scripted_turn(messages):
+    """Next (content, tool_calls) for a conversation — follows PLANS, else scripted_reply()"""
+    users = [m for m in messages if m.get("role") == "user"]
+    task = _last_user_text(users[:1]) if users else ""
+    plan = next((p for trigger, p in PLANS.items() if trigger in task.lower()), None)
+    if plan is None:
+        return scripted_reply(_last_user_text(messages))
+    executed = sum(1 for m in messages if m.get("role") == "tool")
+    for batch in plan:
+        if executed < len(batch):
+            return "", batch[executed:]
+        executed -= len(batch)
+    return "Готово, второе видео играет. Наслаждайся своими котиками.", []
+
+
+def prompt_usage(body):
+    """(prompt tokens, cached tokens): the longest block-aligned prefix of tools + messages seen before is cached"""
+    images = 0
+    parts = [json.dumps(body.get("tools") or [], ensure_ascii=False)]
+    for m in body.get("messages", []):
+        if isinstance(m.get("content"), list):  # Screenshots: detail=low, a flat 85 tokens each
+            content = []
+            for part in m["content"]:
+                if part.get("type") == "image_url":
+                    images += 1
+                    part = {"type": "image_url", "image": hashlib.sha1(part["image_url"]["url"].encode()).hexdigest()}
+                content.append(part)
+            m = {**m, "content": content}
+        parts.append(json.dumps(m, ensure_ascii=False))
+    rendered = "".join(parts)
+    if len(prefix_cache) > 100_000:
+        prefix_cache.clear()
+    digest = hashlib.sha1(rendered[:PREFIX_MIN_CHARS].encode())
+    cached = 0
+    for end in range(PREFIX_MIN_CHARS, len(rendered) + 1, PREFIX_BLOCK_CHARS):
+        if end > PREFIX_MIN_CHARS:
+            digest.update(rendered[end - PREFIX_BLOCK_CHARS:end].encode())
+        key = digest.digest()
+        if key in prefix_cache:
+            cached = end
+        prefix_cache.add(key)
+    return len(rendered) // 3 + 1 + 85 * images, cached // 3
+
+
+def usage_json(prompt, cached, completion):
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion,
+            "prompt_tokens_details": {"cached_tokens": cached}}
+
+
+def chat_completion(content, tool_calls, model, prompt=(100, 0)):
+    message = {"role": "assistant", "content": content or None}
+    if tool_calls:
+        message["tool_calls"] = [
+            {
+                "id": f"call_{i}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(args, ensure_ascii=False)},
+            }
+            for i, (name, args) in enumerate(tool_calls)
+        ]
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": "tool_calls" if tool_calls else "stop",
+        }],
+        "usage": usage_json(*prompt, 20),
+    }
+
+
+def chunk_json(model, delta, finish_reason=None):
+    return json.dumps({
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }, ensure_ascii=False)
+
+
+def split_pieces(text, size=8):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def stream_duration(text):
+    """Total upstream time a streamed reply to `text` takes (to match non-stream LATENCY["chat"])"""
+    content, tool_calls = scripted_reply(text)
+    pieces = sum(len(split_pieces(json.dumps(a, ensure_ascii=False))) for _, a in tool_calls)
+    words = len(content.split(" ")) if content else 0
+    return LATENCY["first_token"] + LATENCY["chunk"] * (pieces + words)
+
+
+async def stream_completion(content, tool_calls, model, usage=False, prompt=(100, 0)):
+    """Tool calls first (args in fragments), then the text word by word"""
+    await asyncio.sleep(LATENCY["first_token"] + LATENCY["prefill_per_token"] * (prompt[0] - prompt[1]))
+    yield f"data: {chunk_json(model, {'role': 'assistant', 'content': ''})}\n\n"
+    for i, (name, args) in enumerate(tool_calls):
+        arguments = json.dumps(args, ensure_ascii=False)
+        head = {"index": i, "id": f"call_{i}", "type": "function", "function": {"name": name, "arguments": ""}}
+        yield f"data: {chunk_json(model, {'tool_calls': [head]})}\n\n"
+        for piece in split_pieces(arguments):
+            await asyncio.sleep(LATENCY["chunk"])
+            part = {"index": i, "function": {"arguments": piece}}
+            yield f"data: {chunk_json(model, {'tool_calls': [part]})}\n\n"
+    for i, word in enumerate(content.split(" ") if content else []):
+        await asyncio.sleep(LATENCY["chunk"])
+        yield f"data: {chunk_json(model, {'content': word if i == 0 else ' ' + word})}\n\n"
+    finish = "tool_calls" if tool_calls else "stop"
+    yield f"data: {chunk_json(model, {}, finish)}\n\n"
+    if usage:  # stream_options.include_usage: one last chunk without choices
+        completion = len(content or "") // 3 + 1
+        last = json.loads(chunk_json(model, {}))
+        last["choices"] = []
+        last["usage"] = usage_json(*prompt, completion)
+        yield f"data: {json.dumps(last)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    STATS["chat"] += 1
+    fault = injected_fault("chat")
+    if fault:
+        return fault
+    raw = await request.body()
+    STATS["chat_bytes"] += len(raw)
+    if LATENCY["uplink_mbps"]:
+        await asyncio.sleep(len(raw) * 8 / (LATENCY["uplink_mbps"] * 1e6))
+    body = json.loads(raw)
+    model = body.get("model", "gpt-4o")
+    MODEL_CALLS[model] = MODEL_CALLS.get(model, 0) + 1
+    CHAT_MESSAGES.append(len(body.get("messages", [])))
+    fault, slow = chaos(model)
+    if fault:
+        return fault
+    await asyncio.sleep(slow)
+    content, tool_calls = scripted_turn(body.get("messages", []))
+    prompt = prompt_usage(body)
+    if body.get("stream"):
+        usage = (body.get("stream_options") or {}).get("include_usage", False)
+        return StreamingResponse(stream_completion(content, tool_calls, model, usage, prompt),
+                                 media_type="text/event-stream")
+    await asyncio.sleep(LATENCY["chat"] + LATENCY["prefill_per_token"] * (prompt[0] - prompt[1]))
+    return JSONResponse(chat_completion(content, tool_calls, model, prompt))
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(request: Request):
+    STATS["stt"] += 1
+    fault = injected_fault("stt")
+    if fault:
+        return fault
+    fault, slow = chaos()
+    if fault:
+        return fault
+    raw = await request.body()
+    STATS["stt_bytes"] += len(raw)
+    if LATENCY["uplink_mbps"]:
+        await asyncio.sleep(len(raw) * 8 / (LATENCY["uplink_mbps"] * 1e6))
+    await asyncio.sleep(LATENCY["stt"] + slow)
+    return JSONResponse({"text": "открой ютуб"})
+
+
+@app.post("/v1/audio/speech")
+async def speech(request: Request):
+    STATS["tts"] += 1
+    fault = injected_fault("tts")
+    if fault:
+        return fault
+    fault, slow = chaos()
+    if fault:
+        return fault
+    body = await request.json()
+    text = body.get("input", "")
+    await asyncio.sleep(LATENCY["tts"] + LATENCY["tts_per_char"] * len(text) + slow)
+    # Fake audio: format magic + ~1 KB of payload per 10 characters, sent in 4 KB chunks
+    magic, media_type = (b"OggS", "audio/ogg") if body.get("response_format") == "opus" else (b"ID3", "audio/mpeg")
+    payload = magic + b"\x00" * (100 * max(len(text), 10))
+    chunks = [payload[i:i + 4096] for i in range(0, len(payload), 4096)]
+    return StreamingResponse(iter(chunks), media_type=media_type)
+
+
+@app.get("/v1/models")
+async def models():
+    STATS["models"] += 1
+    await asyncio.sleep(LATENCY["models"])
+    return JSONResponse({"object": "list", "data": [
+        {"id": "gpt-4o", "object": "model", "created": 0, "owned_by": "fake"},
+    ]})
+
+
+# ============================================================
+# SERVER HELPERS
+# ============================================================
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_in_thread(asgi_app, port=None):
+    """Run an ASGI app with uvicorn in a daemon thread, return (server, base_url)"""
+    port = port or free_port()
+    config = uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def start():
+    """Start the fake OpenAI server, return its /v1 base URL"""
+    server, url = serve_in_thread(app)
+    return server, f"{url}/v1"
+
+
+if __name__ == "__main__":
+    port = free_port()
+    print(f"Fake OpenAI on http://127.0.0.1:{port}/v1")
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="info")
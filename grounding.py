@@ -0,0 +1,194 @@
+"""
+MAUZER AI — Page grounding
+click_text / type_text only need to know which element on the page the user meant, not what the
+page looks like. The browser sends a compact snapshot of the page's interactive elements once per
+navigation (POST /api/page); each page gets a character-trigram index of its element texts. A
+follow-up like "нажми Войти" is matched against it: a confident match becomes the tool call with
+the element's exact text, no model call; an unsure one goes to the model as a few lines of
+candidates instead of a ~85-token screenshot. With a SharedStore, snapshots are written there too,
+so a page indexed by one worker process is known to all of them.
+"""
+import time
+from collections import Counter, OrderedDict
+
+from command_cache import WORD, jaccard, trigrams
+
+INPUT_ROLES = {"textbox", "searchbox", "combobox", "spinbutton", "input", "textarea", "search"}
+GROUNDED_TOOLS = {"click_text": "text", "type_text": "target_text"}  # Tool -> argument naming the element
+
+
+def normalize(text):
+    """Lowercase, ё->е, words only — unlike command normalization, no word is dropped"""
+    return " ".join(WORD.findall(text.lower().replace("ё", "е")))
+
+
+def element_name(element, inputs=False):
+    """What the browser matches the element by: visible text, or for inputs their label/placeholder"""
+    if inputs:
+        return element["label"] or element["text"]
+    return element["text"] or element["label"]
+
+
+class PageIndex:
+    """Elements of one page and an inverted trigram index over their texts and labels"""
+
+    def __init__(self, snapshot, max_elements=1500, max_text=120):
+        self.url = snapshot.get("url") or ""
+        self.title = snapshot.get("title") or ""
+        self.elements = []  # {"id", "role", "text", "label"}, in document order
+        self.keys = []  # (element position, normalized text, trigrams, trigrams of each word)
+        self.index = {}  # trigram -> [key positions]
+        for raw in (snapshot.get("elements") or [])[:max_elements]:
+            if not isinstance(raw, dict):
+                continue
+            element = {"id": raw.get("id"), "role": str(raw.get("role") or "").lower()[:32],
+                       "text": " ".join(str(raw.get("text") or "").split())[:max_text],
+                       "label": " ".join(str(raw.get("label") or "").split())[:max_text]}
+            seen = set()
+            for name in (element["text"], element["label"]):
+                key = normalize(name)
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                grams = trigrams(key)
+                for g in grams:
+                    self.index.setdefault(g, []).append(len(self.keys))
+                self.keys.append((len(self.elements), key, grams, [trigrams(w) for w in key.split()]))
+            if seen:
+                self.elements.append(element)
+
+    def search(self, query, inputs=False, limit=5, floor=0.0):
+        """[(score, element, aligned)] scoring at least floor, best first, one entry per element.
+        Score: mean of the share of the query's trigrams found in the element and their Dice overlap;
+        halved unless every query word matches a word of the element (aligned — stops "выйти"
+        passing for "войти")"""
+        key = normalize(query)
+        grams = trigrams(key) if key else set()
+        shared = Counter()
+        for g in grams:
+            shared.update(self.index.get(g, ()))
+        words = [trigrams(w) for w in key.split()]
+        best = {}
+        for k, n in shared.items():
+            position, _, key_grams, key_words = self.keys[k]
+            element = self.elements[position]
+            if inputs and element["role"] not in INPUT_ROLES:
+                continue
+            score = (n / len(grams) + 2 * n / (len(grams) + len(key_grams))) / 2
+            if score < floor or score <= best.get(position, (0.0,))[0]:  # Most keys share a gram or two: skip early
+                continue
+            aligned = all(any(jaccard(w, kw) >= 0.4 for kw in key_words) for w in words)
+            if not aligned:
+                score /= 2
+            if score >= floor and score > best.get(position, (0.0,))[0]:
+                best[position] = (score, aligned)
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], item[0]))[:limit]
+        return [(round(score, 3), self.elements[position], aligned) for position, (score, aligned) in ranked]
+
+
+class Grounding:
+    def __init__(self, ttl=1800, max_pages=256, max_elements=1500, threshold=0.6, margin=0.1,
+                 hint_threshold=0.3, hint_size=5, store=None):
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self.max_elements = max_elements
+        self.threshold = threshold  # Best score for a local tool call...
+        self.margin = margin  # ...and its lead over the next element with a different text
+        self.hint_threshold = hint_threshold  # Candidates listed for the model instead of a screenshot
+        self.hint_size = hint_size
+        self.store = store  # shared.SharedStore of other worker processes, or None
+        self.pages = OrderedDict()  # page_id -> (PageIndex, expires), least recently used first
+        self.stats = {"pages_indexed": 0, "pages_shared": 0, "elements_indexed": 0, "missing_page": 0,
+                      "resolved": 0, "ambiguous": 0, "unmatched": 0, "screenshots_dropped": 0,
+                      "tokens_saved": 0, "saved_ms": 0.0}
+
+    def push(self, page_id, snapshot):
+        """Index a page snapshot {url, title, elements: [{id, role, text, label}]} (replaces the old one)"""
+        page = PageIndex(snapshot, self.max_elements)
+        self._insert(page_id, page)
+        self.stats["pages_indexed"] += 1
+        self.stats["elements_indexed"] += len(page.elements)
+        if self.store is not None:
+            self.store.put("page", page_id, {"url": page.url, "title": page.title, "elements": page.elements},
+                           ttl=self.ttl)
+        return page
+
+    def page(self, page_id):
+        """The page's index, or None (never pushed, or expired). With a store, a page this process
+        does not have is for load() to find"""
+        entry = self.pages.get(page_id)
+        if entry is not None and entry[1] < time.time():
+            del self.pages[page_id]
+            entry = None
+        if entry is None:
+            if self.store is None:
+                self.stats["missing_page"] += 1
+            return None
+        self.pages.move_to_end(page_id)
+        return entry[0]
+
+    def load(self, page_id):
+        """A page pushed to another worker, indexed here, or None (blocking — run off the event loop)"""
+        snapshot = self.store.get("page", page_id) if self.store is not None else None
+        if snapshot is None:
+            self.stats["missing_page"] += 1
+            return None
+        self.stats["pages_shared"] += 1
+        page = PageIndex(snapshot, self.max_elements)
+        self._insert(page_id, page)
+        return page
+
+    def _insert(self, page_id, page):
+        self.pages.pop(page_id, None)
+        self.pages[page_id] = (page, time.time() + self.ttl)
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+
+    def ground(self, page, call):
+        """A click_text/type_text call {"name", "args"} on an indexed page -> (call, None) with the
+        element's exact text when the match is confident, (None, hint text for the model) when there
+        are plausible candidates, else (None, None). Several elements containing every word of the
+        target ("аккаунт": "Настройки аккаунта", "Удалить аккаунт") are ambiguous however they score,
+        unless one of them is exactly the target"""
+        arg = GROUNDED_TOOLS[call["name"]]
+        inputs = call["name"] == "type_text"
+        query = call["args"][arg]
+        ranked = page.search(query, inputs=inputs, limit=self.hint_size + 1, floor=self.hint_threshold)
+        if ranked:
+            score, element, aligned = ranked[0]
+            name = element_name(element, inputs)
+            others = [(s, a) for s, e, a in ranked[1:] if normalize(element_name(e, inputs)) != normalize(name)]
+            runner_up = others[0][0] if others else 0.0
+            rival = aligned and normalize(name) != normalize(query) and any(a for _, a in others)
+            if score >= self.threshold and score - runner_up >= self.margin and not rival:
+                self.stats["resolved"] += 1
+                args = dict(call["args"], **{arg: name})
+                if element["id"] is not None:
+                    args["element_id"] = element["id"]
+                return {"name": call["name"], "args": args}, None
+        candidates = [element for _, element, _ in ranked[:self.hint_size]]
+        if not candidates:
+            self.stats["unmatched"] += 1
+            return None, None
+        self.stats["ambiguous"] += 1
+        lines = [f"- {element['role'] or 'element'}: {element['text'] or element['label']}"
+                 + (f" ({element['label']})" if element["text"] and element["label"] else "")
+                 for element in candidates]
+        kind = "поля ввода" if inputs else "элементы"
+        return None, f"Скриншота нет. Подходящие {kind} на странице «{page.title[:80]}»:\n" + "\n".join(lines)
+
+    def saved(self, tokens, ms=0.0, screenshot=False):
+        """Account what a grounded action did not send upstream (screenshot: one was dropped for a hint)"""
+        self.stats["tokens_saved"] += tokens
+        self.stats["saved_ms"] += ms
+        self.stats["screenshots_dropped"] += screenshot
+
+    def report(self):
+        decided = self.stats["resolved"] + self.stats["ambiguous"] + self.stats["unmatched"]
+        return {
+            "pages": len(self.pages),
+            "shared": self.store is not None,
+            **self.stats,
+            "saved_ms": round(self.stats["saved_ms"], 1),
+            "local_rate": round(self.stats["resolved"] / decided, 3) if decided else None,
+        }
@@ -0,0 +1,231 @@
+"""
+MAUZER AI — Health and readiness
+Liveness is free; readiness comes from state kept current in the background, so a probe never
+waits on the model API. Real traffic reports every upstream outcome (error rates, circuit breakers
+per dependency); a background prober only calls the engine when there was no recent successful
+traffic, and backs off while it keeps failing. The readiness document is rendered at most once
+per max_age and served as cached bytes.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+OUTAGE_STATUSES = {401, 403, 404, 408, 429}  # Revoked key, missing model, upstream timeout, throttled — and any 5xx
+TRANSPORT_ERRORS = {"APIConnectionError", "TransportError"}  # openai / httpx base classes (imported lazily: by name)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; after `cooldown` seconds one trial call is let
+    through (half-open) while the rest are still refused — success closes it again, failure re-opens it"""
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0  # Consecutive
+        self.opened_at = None
+        self.probing = False  # Half-open: the trial call is out
+        self.trips = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return CLOSED
+        return HALF_OPEN if time.monotonic() - self.opened_at >= self.cooldown else OPEN
+
+    def allow(self):
+        state = self.state
+        if state == HALF_OPEN:
+            if self.probing:
+                return False
+            self.probing = True
+        return state != OPEN
+
+    def release(self):
+        """The trial call ended without an outcome (cancelled) — let the next caller try"""
+        self.probing = False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN or (self.opened_at is None and self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+            self.trips += 1
+
+
+def is_outage(error):
+    """Does this exception say the dependency is unwell? Connection errors, timeouts, OUTAGE_STATUSES and
+    5xx do; other 4xx are the request's own fault (bad input, an upload too big or of the wrong type)"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in OUTAGE_STATUSES or status >= 500
+    return (isinstance(error, (TimeoutError, OSError))
+            or any(cls.__name__ in TRANSPORT_ERRORS for cls in type(error).__mro__))
+
+
+class Dependency:
+    def __init__(self, name, window=60.0, threshold=5, cooldown=30.0):
+        self.name = name
+        self.window = window
+        self.outcomes = deque(maxlen=2048)  # (monotonic time, ok) of recent upstream calls
+        self.breaker = CircuitBreaker(threshold, cooldown)
+        self.in_flight = 0  # Waiting for an upstream slot included
+        self.last_ok = None
+        self.last_error = None
+
+    def record(self, ok, error=None):
+        now = time.monotonic()
+        self.outcomes.append((now, ok))
+        if ok:
+            self.last_ok = now
+            self.breaker.success()
+        else:
+            self.last_error = (now, f"{type(error).__name__}: {error}"[:200])
+            self.breaker.failure()
+
+    def error_rate(self):
+        cutoff = time.monotonic() - self.window
+        while self.outcomes and self.outcomes[0][0] < cutoff:
+            self.outcomes.popleft()
+        if not self.outcomes:
+            return None
+        return sum(1 for _, ok in self.outcomes if not ok) / len(self.outcomes)
+
+    def report(self, engine_ok):
+        rate = self.error_rate()
+        breaker = self.breaker.state
+        if breaker == OPEN:
+            status = "down"
+        elif (rate is not None and rate > 0.1) or breaker == HALF_OPEN:
+            status = "degraded"
+        elif rate is None and engine_ok is not True:  # No traffic to go by — the prober's verdict
+            status = "unknown" if engine_ok is None else "down"
+        else:
+            status = "ok"
+        now = time.monotonic()
+        return {
+            "status": status,
+            "error_rate": None if rate is None else round(rate, 3),
+            "calls": len(self.outcomes),
+            "in_flight": self.in_flight,
+            "breaker": breaker,
+            "breaker_trips": self.breaker.trips,
+            "last_ok_s": None if self.last_ok is None else round(now - self.last_ok, 1),
+            "last_error": None if self.last_error is None else self.last_error[1],
+        }
+
+
+class Readiness:
+    def __init__(self, probe, deps=("chat", "stt", "tts"), required=("chat",), limit=1, interval=15.0,
+                 retry=2.0, max_backoff=120.0, timeout=5.0, max_age=1.0):
+        self.probe = probe  # async () -> None, raises when the engine is unreachable
+        self.deps = {name: Dependency(name) for name in deps}
+        self.required = required  # Not ready while one of these is down
+        self.limit = limit  # Upstream concurrency slots, for saturation
+        self.interval = interval
+        self.retry = retry  # First retry delay after a failed probe, doubling up to max_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.max_age = max_age
+        self.engine_ok = None  # None until the first probe
+        self.engine_error = None
+        self.probes = {"sent": 0, "skipped": 0, "failed": 0, "consecutive_failures": 0}
+        self.last_probe = None
+        self.task = None
+        self._cached = None  # (rendered at, ready, JSON bytes)
+
+    # ---- traffic ----
+    def begin(self, dep):
+        self.deps[dep].in_flight += 1
+
+    def end(self, dep, ok, error=None):
+        """One upstream call finished — ok, failed with error, or neither (cancelled by the caller)"""
+        d = self.deps[dep]
+        d.in_flight -= 1
+        if ok or (error is not None and not is_outage(error)):
+            d.record(True)
+            self.engine_ok, self.engine_error = True, None  # Live traffic beats a stale failed probe
+        elif error is not None:
+            d.record(False, error)
+        else:
+            d.breaker.release()
+
+    def fail(self, dep, error):
+        """A failed call whose attempt was cancelled before it could report (its deadline passed)"""
+        self.deps[dep].record(False, error)
+
+    # ---- background prober ----
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(await self.check())
+
+    async def check(self):
+        """Probe the engine unless traffic proved it healthy within the interval; returns the next delay"""
+        now = time.monotonic()
+        recent = [d.last_ok for d in self.deps.values() if d.last_ok is not None]
+        if recent and now - max(recent) < self.interval:
+            self.probes["skipped"] += 1
+            return self.interval - (now - max(recent)) + 0.01
+        self.probes["sent"] += 1
+        self.last_probe = now
+        try:
+            await asyncio.wait_for(self.probe(), self.timeout)
+        except Exception as e:
+            self.probes["failed"] += 1
+            self.probes["consecutive_failures"] += 1
+            self.engine_ok = False
+            self.engine_error = f"{type(e).__name__}: {e}"[:200]
+            self._cached = None
+            return min(self.retry * 2 ** (self.probes["consecutive_failures"] - 1), self.max_backoff)
+        self.probes["consecutive_failures"] = 0
+        self.engine_ok = True
+        self.engine_error = None
+        self._cached = None
+        return self.interval
+
+    # ---- reports ----
+    def report(self):
+        deps = {name: d.report(self.engine_ok) for name, d in self.deps.items()}
+        in_flight = sum(d.in_flight for d in self.deps.values())
+        if self.engine_ok is False or any(deps[name]["status"] == "down" for name in self.required):
+            status = "unavailable"
+        else:
+            status = "ready" if self.engine_ok else "starting"  # Starting: first probe not back yet
+        return {
+            "status": status,
+            "engine": {"ok": self.engine_ok, "error": self.engine_error,
+                       "last_probe_s": None if self.last_probe is None
+                       else round(time.monotonic() - self.last_probe, 1), **self.probes},
+            "dependencies": deps,
+            "pool": {"in_flight": in_flight, "limit": self.limit,
+                     "saturation": round(min(in_flight / self.limit, 1.0), 3),
+                     "queued": max(in_flight - self.limit, 0)},
+        }
+
+    def snapshot(self):
+        """(ready, JSON bytes) — re-rendered at most every max_age seconds"""
+        now = time.monotonic()
+        if self._cached is None or now - self._cached[0] >= self.max_age:
+            report = self.report()
+            self._cached = (now, report["status"] == "ready",
+                            json.dumps(report, ensure_ascii=False).encode())
+        return self._cached[1], self._cached[2]
@@ -0,0 +1,199 @@
+"""
+MAUZER AI — Local intent router
+Simple browser commands ("назад", "листай вниз", "открой ютуб") become tool calls locally,
+without a GPT-4o round trip. Compiled patterns + a site alias index, with a tiny naive Bayes
+classifier as a backstop for the argument-free intents. Anything unsure -> None (use the model).
+"""
+import math
+import re
+from collections import Counter
+
+SITE_ALIASES = {
+    "https://youtube.com": ["ютуб", "ютюб", "youtube", "утуб"],
+    "https://google.com": ["гугл", "google"],
+    "https://ya.ru": ["яндекс", "yandex"],
+    "https://vk.com": ["вк", "вконтакте", "vk"],
+    "https://web.telegram.org": ["телеграм", "телеграмм", "телега", "telegram"],
+    "https://github.com": ["гитхаб", "github"],
+    "https://twitch.tv": ["твич", "twitch"],
+    "https://ru.wikipedia.org": ["википедия", "вики", "wikipedia"],
+    "https://mail.google.com": ["почта", "почту", "gmail", "джимейл"],
+    "https://www.instagram.com": ["инстаграм", "инста", "instagram"],
+    "https://www.tiktok.com": ["тикток", "tiktok"],
+    "https://www.reddit.com": ["реддит", "reddit"],
+    "https://open.spotify.com": ["спотифай", "spotify"],
+    "https://www.kinopoisk.ru": ["кинопоиск"],
+    "https://www.avito.ru": ["авито", "avito"],
+    "https://www.ozon.ru": ["озон", "ozon"],
+    "https://www.wildberries.ru": ["вайлдберриз", "вайлдбериз", "wildberries", "вб"],
+    "https://chat.openai.com": ["чатгпт", "chatgpt"],
+    "https://x.com": ["твиттер", "twitter"],
+    "https://music.yandex.ru": ["яндекс музыка", "яндекс музыку"],
+}
+
+FILLER = r"(?:(?:ну|давай|пожалуйста|плиз|маузер|эй|слушай|короче|бро|а)[,!]?\s+)*"
+TAIL = r"(?:[,\s]+(?:пожалуйста|плиз|быстро|быстрее))*[.!?]*$"
+
+
+def _intent(pattern):
+    return re.compile("^" + FILLER + pattern + TAIL)
+
+
+OPEN = "(?:открой|открыть|зайди на|зайди в|перейди на|перейди в|запусти|включи|покажи)"
+SEARCH = "(?:найди|загугли|погугли|гугли|поищи|ищи|найти|поиск)"
+YOUTUBE = "(?:ютубе|ютуб|youtube|ютюбе)"
+
+PATTERNS = [
+    ("go_back", _intent(r"(?:назад|вернись(?: назад)?|вернись на (?:прошлую|предыдущую) страницу|go back|back)")),
+    ("go_forward", _intent(r"(?:вперед|вперёд|дальше по истории|forward)")),
+    ("scroll", _intent(r"(?:(?:листай|прокрути|пролистай|скролль|крути|мотай|промотай)(?: страницу)?\s+)?"
+                       r"(?P<direction>вниз|вверх|ниже|выше)")),
+    ("search_youtube", _intent(SEARCH + r"\s+(?:на|в)\s+" + YOUTUBE + r"\s+(?P<query>.+?)")),
+    ("search_youtube", _intent(SEARCH + r"\s+(?P<query>.+?)\s+(?:на|в)\s+" + YOUTUBE)),
+    ("open_website", _intent(OPEN + r"\s+(?P<site>[\w.\-]+(?:\s[\w.\-]+)?)")),
+    ("google_search", _intent(SEARCH + r"(?:\s+(?:в|на)\s+(?:гугле|google|интернете))?\s+(?P<query>.+?)")),
+    ("click_text", _intent(r"(?:нажми|кликни|жми|тыкни|ткни|клик)(?:\s+на)?\s+(?:кнопку\s+)?(?P<text>.+?)")),
+    # Only with a field named: "напиши анекдот в стиле пушкина" is a chat request, not typing
+    ("type_text", _intent(r"(?:введи|напиши|напечатай|впиши|вбей)\s+(?P<value>.+?)\s+в\s+"
+                          r"(?:(?:поле|строку|строке|графу|графе|окно|окошко)\s+(?P<target>.+?)"
+                          r"|(?P<search>поиск|поисковую строку|строку поиска))")),
+]
+
+DIRECTIONS = {"вниз": "down", "ниже": "down", "вверх": "up", "выше": "up"}
+DOMAIN = re.compile(r"^[a-z0-9\-]+(?:\.[a-z0-9\-]+)+$")
+# Arguments that need the model: page references ("на странице", "в этом коде", "где"), chained
+# actions ("найди и открой ютуб") and ordinals ("первую ссылку" — which one only the page can tell)
+ON_PAGE = re.compile(r"(?:^|\s)(?:(?:на|в)\s+(?:этой\s+)?(?:странице|сайте|тексте)|здесь|тут|где"
+                     r"|эт(?:от|ом|ой|у|о|и|их|ими)|и|а|или|потом|затем|после)(?=\s|$)")
+ORDINAL = re.compile(r"(?:^|\s)(?:перв|втор|трет|четверт|пят|шест|седьм|восьм|девят|десят|последн|предпоследн)"
+                     r"[а-я]*(?=\s|$)")
+
+
+def needs_model(arg):
+    low = arg.lower()
+    return bool(ON_PAGE.search(low) or ORDINAL.search(low))
+
+# Tiny labeled set for the fallback classifier (argument-free intents only, plus "none")
+TRAINING = {
+    "go_back": ["вернись обратно", "верни предыдущую страницу", "назад давай", "отмотай назад на страницу",
+                "вернуться назад", "шаг назад", "верни как было", "назад на прошлую"],
+    "go_forward": ["вперед на страницу", "верни вперед", "следующая страница в истории", "иди вперед"],
+    "scroll_down": ["опусти страницу", "спустись ниже", "пролистни еще", "еще ниже", "прокрути еще", "давай ниже"],
+    "scroll_up": ["подними страницу", "поднимись наверх", "наверх", "в самый верх", "обратно наверх", "давай выше"],
+    "none": ["привет как дела", "расскажи анекдот", "что ты видишь на экране", "кто ты такой", "сколько времени",
+             "какая погода", "что это за сайт", "объясни что тут написано", "ты тупой", "спасибо", "как тебя зовут",
+             "напомни мне завтра", "переведи это на английский", "сделай скриншот", "что мне посмотреть"],
+}
+
+
+def _clean(text):
+    return text.strip().lower().replace("ё", "е")
+
+
+def _features(text):
+    words = re.findall(r"[a-zа-я0-9]+", _clean(text))
+    grams = [w[i:i + 3] for w in words for i in range(max(1, len(w) - 2))]
+    return words + grams
+
+
+class NaiveBayes:
+    def __init__(self, examples):
+        self.counts = {label: Counter() for label in examples}
+        self.totals = {}
+        self.priors = {}
+        n = sum(len(v) for v in examples.values())
+        for label, texts in examples.items():
+            for text in texts:
+                self.counts[label].update(_features(text))
+            self.totals[label] = sum(self.counts[label].values())
+            self.priors[label] = math.log(len(texts) / n)
+        self.vocab = len(set().union(*self.counts.values()))
+
+    def coverage(self, text, label):
+        """Share of the text's words seen in the label's examples — NB is overconfident on unseen text"""
+        words = re.findall(r"[a-zа-я0-9]+", _clean(text))
+        return sum(1 for w in words if self.counts[label][w]) / len(words) if words else 0.0
+
+    def predict(self, text):
+        """(label, probability)"""
+        feats = _features(text)
+        scores = {}
+        for label, counts in self.counts.items():
+            denom = self.totals[label] + self.vocab
+            scores[label] = self.priors[label] + sum(math.log((counts[f] + 1) / denom) for f in feats)
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1.0 / norm
+
+
+class IntentRouter:
+    def __init__(self, use_classifier=True, min_confidence=0.9):
+        self.aliases = {}
+        for url, names in SITE_ALIASES.items():
+            for name in names:
+                self.aliases[name] = url
+        self.classifier = NaiveBayes(TRAINING) if use_classifier else None
+        self.min_confidence = min_confidence
+        self.stats = {"routed": 0, "classified": 0, "fallback": 0}
+
+    def site_url(self, site):
+        """Alias ('ютубе', 'вк') or bare domain ('habr.com') -> URL, else None"""
+        site = site.strip(" .")
+        if site in self.aliases:
+            return self.aliases[site]
+        for cut in (1, 2):  # Russian case endings: ютубе, ютуба, википедию
+            if len(site) - cut >= 3 and site[:-cut] in self.aliases:
+                return self.aliases[site[:-cut]]
+            if len(site) - cut >= 3 and site[:-cut] + "я" in self.aliases:
+                return self.aliases[site[:-cut] + "я"]
+        if DOMAIN.match(site):
+            return "https://" + site
+        return None
+
+    def route(self, text):
+        """Command -> [{"name", "args"}] when confident, else None"""
+        original = text.strip()
+        low = _clean(original)  # Same length as original, so spans map back to the user's casing
+        for name, pattern in PATTERNS:
+            m = pattern.match(low)
+            if m is None:
+                continue
+            call = self._call(name, m, original)
+            if call is not None:
+                self.stats["routed"] += 1
+                return [call]
+        if self.classifier is not None:
+            label, p = self.classifier.predict(low)
+            if label != "none" and p >= self.min_confidence and self.classifier.coverage(low, label) >= 0.5:
+                self.stats["classified"] += 1
+                if label.startswith("scroll_"):
+                    return [{"name": "scroll", "args": {"direction": label[len("scroll_"):]}}]
+                return [{"name": label, "args": {}}]
+        self.stats["fallback"] += 1
+        return None
+
+    def _call(self, name, m, original):
+        def group(key):
+            return original[m.start(key):m.end(key)].strip(" ,.!?\"«»")
+
+        if name in ("go_back", "go_forward"):
+            return {"name": name, "args": {}}
+        if name == "scroll":
+            return {"name": name, "args": {"direction": DIRECTIONS[m.group("direction")]}}
+        if name == "open_website":
+            url = self.site_url(m.group("site"))
+            return {"name": name, "args": {"url": url}} if url else None
+        if name in ("google_search", "search_youtube"):
+            query = group("query")
+            if not query or needs_model(query):
+                return None
+            return {"name": name, "args": {"query": query}}
+        if name == "click_text":
+            target = group("text")
+            return {"name": name, "args": {"text": target}} if target and not needs_model(target) else None
+        if name == "type_text":
+            value, target = group("value"), group("target" if m.group("target") else "search")
+            if not value or not target or needs_model(target):
+                return None
+            return {"name": name, "args": {"target_text": target, "value": value}}
+        return None
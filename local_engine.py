@@ -0,0 +1,420 @@
+"""
+MAUZER AI — Local inference engine
+Offline stand-in for the AsyncOpenAI client: a small quantized instruct model for chat/tool calls
+and a Whisper model for STT, both on CPU. Models load lazily on first use and stay resident;
+concurrent callers are collected into micro-batches and share one generate() pass.
+"""
+import asyncio
+import io
+import json
+import re
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+from openai.types import Model
+from openai.types.audio import Transcription
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+try:
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+    from transformers.generation.streamers import BaseStreamer
+except ImportError:  # Local engine unavailable -> only the OpenAI engine works
+    torch = None
+    BaseStreamer = object
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+TOOL_CALL = re.compile(r"<tool_call>\s*(\{.*?\})\s*</tool_call>", re.S)
+TOOL_CALL_START = "<tool_call>"
+
+
+def available():
+    return torch is not None
+
+
+# ============================================================
+# MICRO-BATCHING
+# ============================================================
+class Batcher:
+    """Collects submissions for up to `window` seconds (or max_batch items) and runs them
+    together with a blocking run(items) -> results in a worker thread"""
+
+    def __init__(self, run, max_batch=4, window=0.01):
+        self.run = run
+        self.max_batch = max_batch
+        self.window = window
+        self.queue = None
+        self.worker = None
+        self.loop = None
+        self.stats = {"batches": 0, "items": 0}
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        if self.worker is None or self.worker.done() or self.loop is not loop:
+            self.loop = loop
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.create_task(self._work())
+        future = loop.create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            try:
+                results = await asyncio.to_thread(self.run, [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+# ============================================================
+# CHAT — quantized instruct model with tool calling
+# ============================================================
+class ChatJob:
+    __slots__ = ("prompt", "max_tokens", "loop", "events", "tokens", "text", "finished")
+
+    def __init__(self, prompt, max_tokens, loop, stream):
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.loop = loop
+        self.events = asyncio.Queue() if stream else None  # Text deltas for streaming callers
+        self.tokens = []
+        self.text = ""
+        self.finished = False
+
+    def emit(self, delta):
+        if self.events is not None and delta:
+            self.loop.call_soon_threadsafe(self.events.put_nowait, delta)
+
+
+class BatchStreamer(BaseStreamer):
+    """Demultiplexes a batched generate() into per-job text deltas"""
+
+    def __init__(self, tokenizer, jobs, stop_ids):
+        self.tokenizer = tokenizer
+        self.jobs = jobs
+        self.stop_ids = stop_ids
+        self.prompt_seen = False
+
+    def put(self, value):
+        if not self.prompt_seen:  # First call carries the prompt ids
+            self.prompt_seen = True
+            return
+        for job, token in zip(self.jobs, value.reshape(len(self.jobs), -1)[:, -1].tolist()):
+            if job.finished:
+                continue
+            if token in self.stop_ids or len(job.tokens) >= job.max_tokens:
+                job.finished = True
+                continue
+            job.tokens.append(token)
+            text = self.tokenizer.decode(job.tokens, skip_special_tokens=True)
+            if text.endswith("�"):  # Half of a multi-byte character — wait for the rest
+                continue
+            job.emit(text[len(job.text):])
+            job.text = text
+
+    def end(self):
+        for job in self.jobs:
+            job.finished = True
+
+
+def flatten_messages(messages):
+    """OpenAI messages -> plain chat-template messages (text only, tool args as dicts)"""
+    out = []
+    for msg in messages:
+        content = msg.get("content") or ""
+        if isinstance(content, list):
+            parts = [p["text"] for p in content if p.get("type") == "text"]
+            if any(p.get("type") == "image_url" for p in content):
+                parts.append("[скриншот страницы]")
+            content = "\n".join(parts)
+        flat = {"role": msg["role"], "content": content}
+        if msg.get("tool_calls"):
+            flat["tool_calls"] = [
+                {"type": "function", "function": {"name": tc["function"]["name"],
+                                                  "arguments": json.loads(tc["function"]["arguments"] or "{}")}}
+                for tc in msg["tool_calls"]
+            ]
+        out.append(flat)
+    return out
+
+
+def split_tool_calls(text):
+    """Generated text -> (content without tool call blocks, [(name, arguments JSON)])"""
+    calls = []
+    for m in TOOL_CALL.finditer(text):
+        try:
+            call = json.loads(m.group(1))
+        except ValueError:
+            continue
+        if call.get("name"):
+            calls.append((call["name"], json.dumps(call.get("arguments") or {}, ensure_ascii=False)))
+    content = TOOL_CALL.sub("", text)
+    if TOOL_CALL_START in content:  # Unterminated block (hit max_tokens)
+        content = content[:content.index(TOOL_CALL_START)]
+    return content.strip(), calls
+
+
+def visible_length(text):
+    """How much of a partial generation can be streamed as content: stop at a (possible) tool call start"""
+    if TOOL_CALL_START in text:
+        return text.index(TOOL_CALL_START)
+    for n in range(len(TOOL_CALL_START) - 1, 0, -1):
+        if text.endswith(TOOL_CALL_START[:n]):
+            return len(text) - n
+    return len(text)
+
+
+class LocalChat:
+    """Greedy decoding (temperature is ignored) so callers with different settings can share a batch"""
+
+    def __init__(self, model_id, max_batch=4, window=0.01, threads=None):
+        self.model_id = model_id
+        self.threads = threads
+        self.model = None
+        self.tokenizer = None
+        self.stop_ids = set()
+        self.load_lock = threading.Lock()
+        self.batcher = Batcher(self._generate, max_batch, window)
+        self.stats = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "generate_seconds": 0.0}
+
+    def load(self):
+        """Load once and keep resident (blocking)"""
+        with self.load_lock:
+            if self.model is not None:
+                return
+            if torch is None:
+                raise RuntimeError("Local engine needs torch + transformers (pip install -r requirements.txt)")
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            start = time.perf_counter()
+            tokenizer = AutoTokenizer.from_pretrained(self.model_id, padding_side="left")
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            if torch.cuda.is_available():
+                from transformers import BitsAndBytesConfig
+                model = AutoModelForCausalLM.from_pretrained(
+                    self.model_id, device_map="auto",
+                    quantization_config=BitsAndBytesConfig(load_in_4bit=True, bnb_4bit_compute_dtype=torch.float16))
+            else:
+                # bitsandbytes kernels are CUDA-only; CPU gets dynamic int8 on the Linear layers
+                model = AutoModelForCausalLM.from_pretrained(self.model_id, torch_dtype=torch.float32)
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            model.eval()
+            eos = model.generation_config.eos_token_id
+            self.stop_ids = set(eos if isinstance(eos, list) else [eos]) | {tokenizer.eos_token_id}
+            self.tokenizer, self.model = tokenizer, model
+            print(f"[LOCAL] Chat model {self.model_id} loaded in {time.perf_counter() - start:.1f}s")
+
+    def _generate(self, jobs):
+        """One generate() pass for a batch of prompts (blocking)"""
+        inputs = self.tokenizer([job.prompt for job in jobs], return_tensors="pt", padding=True)
+        inputs = inputs.to(self.model.device)
+        start = time.perf_counter()
+        with torch.inference_mode():
+            self.model.generate(
+                **inputs,
+                max_new_tokens=max(job.max_tokens for job in jobs),
+                do_sample=False,
+                pad_token_id=self.tokenizer.pad_token_id,
+                streamer=BatchStreamer(self.tokenizer, jobs, self.stop_ids),
+            )
+        self.stats["generate_seconds"] += time.perf_counter() - start
+        self.stats["requests"] += len(jobs)
+        self.stats["prompt_tokens"] += int(inputs["attention_mask"].sum())
+        self.stats["completion_tokens"] += sum(len(job.tokens) for job in jobs)
+        return [job.text for job in jobs]
+
+    def prompt(self, messages, tools):
+        return self.tokenizer.apply_chat_template(
+            flatten_messages(messages), tools=tools or None, add_generation_prompt=True, tokenize=False)
+
+    async def create(self, messages, tools=None, max_tokens=512, stream=False, **_):
+        """chat.completions.create() look-alike (ChatCompletion, or an async iterator of chunks)"""
+        await asyncio.to_thread(self.load)
+        job = ChatJob(self.prompt(messages, tools), max_tokens, asyncio.get_running_loop(), stream)
+        if stream:
+            return self._stream(job)
+        text = await self.batcher.submit(job)
+        content, calls = split_tool_calls(text)
+        return ChatCompletion.model_validate({
+            "id": f"local-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": self.model_id,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "tool_calls" if calls else "stop",
+                "message": {"role": "assistant", "content": content or None, "tool_calls": [
+                    {"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+                     "function": {"name": name, "arguments": args}}
+                    for name, args in calls
+                ] or None},
+            }],
+        })
+
+    async def _stream(self, job):
+        chunk_id = f"local-{uuid.uuid4().hex}"
+
+        def chunk(delta, finish_reason=None):
+            return ChatCompletionChunk.model_validate({
+                "id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": self.model_id,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            })
+
+        generation = asyncio.ensure_future(self.batcher.submit(job))
+        text, sent = "", 0
+        while not (generation.done() and job.events.empty()):
+            getter = asyncio.ensure_future(job.events.get())
+            await asyncio.wait((getter, generation), return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                continue
+            text += getter.result()
+            visible = visible_length(text)
+            if visible > sent:
+                yield chunk({"content": text[sent:visible]})
+                sent = visible
+        text = generation.result()  # Raises if generation failed
+
+        content, calls = split_tool_calls(text)
+        if len(content) > sent and TOOL_CALL_START not in text:
+            yield chunk({"content": text[sent:]})
+        for index, (name, args) in enumerate(calls):
+            yield chunk({"tool_calls": [{"index": index, "id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+                                         "function": {"name": name, "arguments": args}}]})
+        yield chunk({}, "tool_calls" if calls else "stop")
+
+
+# ============================================================
+# STT — Whisper-class model
+# ============================================================
+class LocalSTT:
+    def __init__(self, model_id, max_batch=4, window=0.02, threads=None):
+        self.model_id = model_id
+        self.threads = threads
+        self.pipe = None
+        self.load_lock = threading.Lock()
+        self.batcher = Batcher(self._transcribe, max_batch, window)
+        self.stats = {"requests": 0, "audio_seconds": 0.0, "transcribe_seconds": 0.0}
+
+    def load(self):
+        with self.load_lock:
+            if self.pipe is not None:
+                return
+            if torch is None:
+                raise RuntimeError("Local engine needs torch + transformers (pip install -r requirements.txt)")
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            start = time.perf_counter()
+            self.pipe = pipeline("automatic-speech-recognition", model=self.model_id, device="cpu",
+                                 torch_dtype=torch.float32)
+            print(f"[LOCAL] STT model {self.model_id} loaded in {time.perf_counter() - start:.1f}s")
+
+    @staticmethod
+    def decode(raw):
+        """Audio bytes -> pipeline input: decoded samples when soundfile can read them (wav/ogg/flac),
+        else the raw bytes (the pipeline decodes those with ffmpeg)"""
+        if soundfile is not None:
+            try:
+                samples, rate = soundfile.read(io.BytesIO(raw), dtype="float32", always_2d=True)
+                return {"raw": samples.mean(axis=1), "sampling_rate": rate}, len(samples) / rate
+            except Exception:
+                pass
+        return raw, None
+
+    def _transcribe(self, items):
+        """Batched transcription, one pipeline pass per language (blocking)"""
+        texts = [None] * len(items)
+        start = time.perf_counter()
+        for language in {lang for _, lang, _ in items}:
+            idx = [i for i, (_, lang, _) in enumerate(items) if lang == language]
+            results = self.pipe([items[i][0] for i in idx], batch_size=len(idx),
+                                generate_kwargs={"language": language, "task": "transcribe"} if language else None)
+            for i, r in zip(idx, results):
+                texts[i] = r["text"]
+        self.stats["transcribe_seconds"] += time.perf_counter() - start
+        self.stats["requests"] += len(items)
+        self.stats["audio_seconds"] += sum(duration or 0.0 for _, _, duration in items)
+        return texts
+
+    async def create(self, file, language=None, **_):
+        """audio.transcriptions.create() look-alike; file is (name, bytes, content_type) or bytes"""
+        raw = file[1] if isinstance(file, tuple) else file
+        await asyncio.to_thread(self.load)
+        audio, duration = await asyncio.to_thread(self.decode, raw)
+        text = await self.batcher.submit((audio, language, duration))
+        return Transcription(text=text)
+
+
+# ============================================================
+# ENGINE — the subset of AsyncOpenAI that ai_backend uses
+# ============================================================
+class LocalAudio:
+    def __init__(self, transcribe, speech=None):
+        self.transcriptions = SimpleNamespace(create=transcribe)
+        self._speech = speech
+
+    @property
+    def speech(self):
+        """No local TTS — borrowed from another client when one is configured"""
+        if self._speech is None:
+            raise RuntimeError("Local engine has no TTS")
+        return self._speech()
+
+
+class LocalEngine:
+    def __init__(self, chat_model, stt_model, max_batch=4, threads=None, speech=None, window=0.01):
+        self.local_chat = LocalChat(chat_model, max_batch, window, threads=threads)
+        self.local_stt = LocalSTT(stt_model, max_batch, max(window, 0.02), threads=threads)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.local_chat.create))
+        self.audio = LocalAudio(self.local_stt.create, speech)  # speech: callable -> another client's audio.speech
+        self.models = SimpleNamespace(list=self.list_models)
+
+    async def list_models(self, **_):
+        if torch is None:
+            raise RuntimeError("Local engine needs torch + transformers (pip install -r requirements.txt)")
+        return [Model(id=m, object="model", created=0, owned_by="local")
+                for m in (self.local_chat.model_id, self.local_stt.model_id)]
+
+    async def close(self):
+        pass  # Models stay resident for the life of the process
+
+    def stats(self):
+        chat, stt = self.local_chat.stats, self.local_stt.stats
+        return {
+            "chat_model": self.local_chat.model_id,
+            "stt_model": self.local_stt.model_id,
+            "loaded": {"chat": self.local_chat.model is not None, "stt": self.local_stt.pipe is not None},
+            "tokens_per_sec": round(chat["completion_tokens"] / chat["generate_seconds"], 1)
+            if chat["generate_seconds"] else 0.0,
+            "stt_rtf": round(stt["transcribe_seconds"] / stt["audio_seconds"], 3) if stt["audio_seconds"] else 0.0,
+            "chat_batches": self.local_chat.batcher.stats,
+            "stt_batches": self.local_stt.batcher.stats,
+            **{f"chat_{k}": round(v, 3) for k, v in chat.items()},
+        }
@@ -0,0 +1,257 @@
+"""
+MAUZER AI — Metrics and request tracing
+Prometheus text-format counters, gauges and histograms (no client library needed), a request-ID
+context that follows a request into every task it spawns, per-stage timings and JSON log lines.
+"""
+import json
+import time
+import uuid
+from bisect import bisect_left
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+enabled = True
+json_logs = True
+request_id = ContextVar("request_id", default=None)
+trace = ContextVar("trace", default=None)  # {stage: seconds} of the current request
+spent = ContextVar("spent", default=None)  # {kind: tokens} the current request used
+
+
+# ============================================================
+# METRIC TYPES
+# ============================================================
+def label_order(item):
+    return tuple(str(v) for v in item[0])
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}  # label values tuple -> value
+
+    def _label_text(self, key, extra=""):
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labels, key)]  # Keys are the raw label tuples
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.values.items(), key=label_order):
+            lines.append(f"{self.name}{self._label_text(key)} {value:g}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, *labels, value):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]  # per-bucket counts, sum
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total) in sorted(self.values.items(), key=label_order):
+            running = 0
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                labels = self._label_text(key, 'le="%g"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {running}")
+            running += counts[-1]
+            labels = self._label_text(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {running}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {total:.6f}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {running}")
+        return lines
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = register(Counter("mauzer_http_requests_total", "HTTP requests", ("endpoint", "method", "status")))
+HTTP_SECONDS = register(Histogram("mauzer_http_request_seconds", "HTTP request latency (until the last body byte)",
+                                  ("endpoint",)))
+HTTP_TTFB = register(Histogram("mauzer_http_first_byte_seconds", "HTTP time to response start", ("endpoint",)))
+HTTP_IN_FLIGHT = register(Gauge("mauzer_http_in_flight", "HTTP requests being served"))
+WS_CONNECTIONS = register(Gauge("mauzer_websocket_connections", "Open WebSocket connections", ("endpoint",)))
+STAGE_SECONDS = register(Histogram("mauzer_stage_seconds", "Latency per pipeline stage", ("stage",)))
+UPSTREAM_CALLS = register(Counter("mauzer_upstream_calls_total", "Upstream (model API) calls", ("op",)))
+UPSTREAM_ERRORS = register(Counter("mauzer_upstream_errors_total", "Failed upstream calls", ("op", "error")))
+UPSTREAM_ATTEMPTS = register(Counter("mauzer_upstream_attempts_total", "Upstream HTTP attempts incl. retries", ("op",)))
+UPSTREAM_RETRIES = register(Counter("mauzer_upstream_retries_total", "Upstream retries (after a transient error)",
+                                    ("op",)))
+UPSTREAM_EVENTS = register(Counter("mauzer_upstream_resilience_total",
+                                   "Hedged attempts, hedge wins, breaker rejections, model fallbacks", ("op", "event")))
+UPSTREAM_IN_FLIGHT = register(Gauge("mauzer_upstream_in_flight", "Upstream calls in progress", ("op",)))
+TOKENS = register(Counter("mauzer_tokens_total", "Model tokens used", ("kind",)))
+ADMISSION = register(Counter("mauzer_admission_total",
+                             "Requests by priority class: admitted, rate_limited, queue_full, expired",
+                             ("priority", "outcome")))
+
+
+# ============================================================
+# TRACING
+# ============================================================
+class stage:
+    """with stage("vision"): ... — time a pipeline stage into mauzer_stage_seconds and the request's trace
+    (a plain class, not @contextmanager: this sits on the hot path)"""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is None:
+            return
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, self.name)
+        spans = trace.get()
+        if spans is not None:
+            spans[self.name] = spans.get(self.name, 0.0) + elapsed
+
+
+def record_usage(usage):
+    """Token counters (and the request's log line) from an OpenAI usage object (absent on some engines)"""
+    if usage is None or not enabled:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    counts = {"prompt": usage.prompt_tokens or 0, "prompt_cached": cached, "completion": usage.completion_tokens or 0}
+    tokens = spent.get()
+    for kind, n in counts.items():
+        TOKENS.inc(kind, amount=n)
+        if tokens is not None:
+            tokens[kind] = tokens.get(kind, 0) + n
+
+
+def log(event, level="info", **fields):
+    """One JSON log line, tagged with the current request ID"""
+    if not json_logs:
+        return
+    print(json.dumps({"ts": round(time.time(), 3), "level": level, "event": event,
+                      "request_id": request_id.get(), **fields}, ensure_ascii=False, default=str))
+
+
+UPSTREAM_PATHS = (("/chat/completions", "chat"), ("/audio/transcriptions", "stt"), ("/audio/speech", "tts"),
+                  ("/models", "models"))
+
+
+async def on_upstream_request(request):
+    """httpx request hook: every HTTP request to the model API, retries and hedges included"""
+    if not enabled:
+        return
+    op = next((op for suffix, op in UPSTREAM_PATHS if request.url.path.endswith(suffix)), "other")
+    UPSTREAM_ATTEMPTS.inc(op)
+
+
+# ============================================================
+# ASGI MIDDLEWARE
+# ============================================================
+class MetricsMiddleware:
+    """Request ID (X-Request-Id in and out), endpoint latency/TTFB histograms, in-flight gauge, JSON access log"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not enabled or scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or ())
+        rid = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex[:16]
+        rid_token = request_id.set(rid)
+        spans = {}
+        trace_token = trace.set(spans)
+        tokens = {}
+        spent_token = spent.set(tokens)
+        path = scope["path"]
+        if scope["type"] == "websocket":
+            WS_CONNECTIONS.inc(path)
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                WS_CONNECTIONS.dec(path)
+                request_id.reset(rid_token)
+                trace.reset(trace_token)
+                spent.reset(spent_token)
+
+        start = time.perf_counter()
+        state = {"status": 500, "ttfb": None}
+        HTTP_IN_FLIGHT.inc()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["ttfb"] = time.perf_counter() - start
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(endpoint, scope["method"], state["status"])
+            HTTP_SECONDS.observe(elapsed, endpoint)
+            if state["ttfb"] is not None:
+                HTTP_TTFB.observe(state["ttfb"], endpoint)
+            log("request", method=scope["method"], path=path, endpoint=endpoint, status=state["status"],
+                ms=round(elapsed * 1000, 2), ttfb_ms=round((state["ttfb"] or elapsed) * 1000, 2),
+                stages={name: round(seconds * 1000, 2) for name, seconds in spans.items()},
+                **({"tokens": tokens} if tokens else {}))
+            request_id.reset(rid_token)
+            trace.reset(trace_token)
+            spent.reset(spent_token)
@@ -0,0 +1,170 @@
+"""
+MAUZER AI — Prompt assembly and token accounting
+The static head of every chat call (system prompt, then the tool schemas) is serialized once and
+frozen: every request starts with the same bytes, so the provider's prompt cache (exact prefix
+match from 1024 tokens on) can serve it, and its token count is known up front for budget checks.
+Usage reports are split into cached and uncached input tokens.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+
+from sessions import IMAGE_TOKENS, MESSAGE_OVERHEAD, estimate_tokens
+from startup import lazy
+
+tiktoken = lazy("tiktoken")  # None when missing -> the session estimate (~3 chars per token)
+
+CACHE_MIN_TOKENS = 1024  # Shorter prefixes are never cached upstream
+_encoding = None
+
+
+class PromptTooLong(ValueError):
+    """The assembled prompt is over the token budget — not sent upstream"""
+
+
+def count_tokens(text):
+    """Tokens in text: tiktoken's o200k_base (the GPT-4o vocabulary) when installed, else an estimate"""
+    global _encoding
+    if not text:
+        return 0
+    if _encoding is None:
+        _encoding = False
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:  # First use downloads the vocabulary
+                print(f"[PROMPT] tiktoken unavailable ({e}) — estimating tokens")
+    return len(_encoding.encode(text)) if _encoding else estimate_tokens(text)
+
+
+def message_tokens(message):
+    """Tokens of one OpenAI chat message dict (screenshots at the detail=low flat rate)"""
+    content = message.get("content")
+    if isinstance(content, list):
+        tokens = sum(IMAGE_TOKENS if part.get("type") == "image_url" else count_tokens(part.get("text", ""))
+                     for part in content)
+    else:
+        tokens = count_tokens(content)
+    if message.get("tool_calls"):
+        tokens += count_tokens(json.dumps(message["tool_calls"], ensure_ascii=False))
+    return MESSAGE_OVERHEAD + tokens
+
+
+class Prefix:
+    """System message + tools, serialized once; the dicts handed to the client are decoded from
+    that serialization, so edits to the source objects can't change what is sent"""
+    __slots__ = ("serialized", "system", "tools", "_tokens", "key")
+
+    def __init__(self, system_prompt, tools):
+        self.serialized = json.dumps({"system": system_prompt, "tools": tools}, ensure_ascii=False,
+                                     separators=(",", ":"))
+        frozen = json.loads(self.serialized)
+        self.system = {"role": "system", "content": frozen["system"]}
+        self.tools = frozen["tools"]
+        self._tokens = None
+        self.key = "mauzer-" + hashlib.sha256(self.serialized.encode()).hexdigest()[:16]  # prompt_cache_key
+
+    @property
+    def tokens(self):
+        """Counted on first use — loading the tokenizer vocabulary is not paid at import"""
+        if self._tokens is None:
+            self._tokens = (MESSAGE_OVERHEAD + count_tokens(self.system["content"])
+                            + count_tokens(json.dumps(self.tools, ensure_ascii=False, separators=(",", ":"))))
+        return self._tokens
+
+    @property
+    def cacheable(self):
+        return self.tokens >= CACHE_MIN_TOKENS
+
+    def intact(self):
+        """Still the bytes frozen at startup (nothing mutated the shared dicts)"""
+        return json.dumps({"system": self.system["content"], "tools": self.tools}, ensure_ascii=False,
+                          separators=(",", ":")) == self.serialized
+
+
+class Prompts:
+    def __init__(self, system_prompt, agent_prompt, tools, token_limit=16000, max_overrides=32):
+        self.default = Prefix(system_prompt, tools)
+        self.agent = Prefix(agent_prompt, tools)
+        self.tools = tools
+        self.token_limit = token_limit  # Whole prompt: prefix + history + user turn
+        self.max_overrides = max_overrides
+        self.overrides = OrderedDict()  # Client system prompt -> its Prefix (LRU)
+
+    def prefix(self, system_prompt=None):
+        """Frozen prefix for the stock prompt or a client's own system prompt"""
+        if not system_prompt:
+            return self.default
+        prefix = self.overrides.get(system_prompt)
+        if prefix is None:
+            prefix = self.overrides[system_prompt] = Prefix(system_prompt, self.tools)
+            while len(self.overrides) > self.max_overrides:
+                self.overrides.popitem(last=False)
+        else:
+            self.overrides.move_to_end(system_prompt)
+        return prefix
+
+    def messages(self, prefix, rest):
+        """[system] + rest after a budget check; raises PromptTooLong"""
+        tokens = prefix.tokens + sum(message_tokens(m) for m in rest)
+        if tokens > self.token_limit:
+            raise PromptTooLong(f"Prompt too long: ~{tokens} tokens (limit {self.token_limit})")
+        return [prefix.system, *rest], tokens
+
+    def report(self):
+        return {
+            "prefix_tokens": self.default.tokens,
+            "agent_prefix_tokens": self.agent.tokens,
+            "cacheable": self.default.cacheable,
+            "intact": self.default.intact() and self.agent.intact(),
+            "overrides": len(self.overrides),
+            "tokenizer": "tiktoken" if _encoding else "estimate",
+            "token_limit": self.token_limit,
+        }
+
+
+class TokenUsage:
+    """Running totals of what the model API billed: cached vs uncached input, output, and how far
+    the local estimate was off"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt = 0
+        self.cached = 0
+        self.completion = 0
+        self.cache_hits = 0  # Calls with any cached input
+        self.estimated = 0  # Local estimate for the calls that had one
+        self.estimated_actual = 0
+        self.latency = {"hit": [0, 0.0], "miss": [0, 0.0]}  # [calls, seconds] of timed calls
+
+    def record(self, usage, estimated=None, seconds=None):
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        prompt = usage.prompt_tokens or 0
+        self.calls += 1
+        self.prompt += prompt
+        self.cached += cached
+        self.completion += usage.completion_tokens or 0
+        self.cache_hits += cached > 0
+        if estimated is not None:
+            self.estimated += estimated
+            self.estimated_actual += prompt
+        if seconds is not None:
+            slot = self.latency["hit" if cached else "miss"]
+            slot[0] += 1
+            slot[1] += seconds
+
+    def report(self):
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt,
+            "cached_tokens": self.cached,
+            "uncached_tokens": self.prompt - self.cached,
+            "completion_tokens": self.completion,
+            "cached_share": round(self.cached / self.prompt, 3) if self.prompt else None,
+            "cache_hit_calls": self.cache_hits,
+            "estimate_ratio": round(self.estimated / self.estimated_actual, 3) if self.estimated_actual else None,
+            "avg_ms": {kind: round(total / n * 1000, 1) if n else None for kind, (n, total) in self.latency.items()},
+        }
@@ -0,0 +1,131 @@
+"""
+MAUZER AI — Resilient upstream calls
+call() runs one logical model API call: an overall deadline, retries of transient errors with
+capped exponential backoff and full jitter, optional hedging (a second identical attempt once the
+first has run longer than the recent p95, first answer wins) and a circuit-breaker gate that
+fails fast instead of queueing callers behind a dead upstream.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+
+from startup import lazy
+
+openai = lazy("openai", required=True)  # Error types only — loaded by the time a call has failed
+
+
+class CircuitOpen(Exception):
+    """The dependency's circuit breaker is open — failing fast"""
+
+
+def retryable(error):
+    """Transient: connection problems, timeouts, 408/409/429 and 5xx. Bad requests and auth errors aren't"""
+    if isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status >= 500 or status in (408, 409, 429))
+
+
+class Policy:
+    def __init__(self, timeout, retries=2, backoff=0.25, max_backoff=2.0, hedge=False, hedge_min=0.05):
+        self.timeout = timeout  # Deadline for the whole call, retries and backoff included
+        self.retries = retries
+        self.backoff = backoff  # Backoff cap before the first retry, doubling per retry up to max_backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.hedge_min = hedge_min  # Never hedge sooner than this, however fast the p95
+
+
+class LatencyWindow:
+    """Recent successful call latencies -> p95 (None until min_samples calls were seen)"""
+
+    def __init__(self, size=200, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._p95 = None
+        self._stale = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self._stale += 1
+
+    def p95(self):
+        if len(self.samples) < self.min_samples:
+            return None
+        if self._p95 is None or self._stale >= 10:  # Re-sort every 10 samples, not on every call
+            ordered = sorted(self.samples)
+            self._p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            self._stale = 0
+        return self._p95
+
+
+async def call(attempt, policy, latency=None, breaker=None, on_event=None, hedge=None):
+    """await attempt() — a fresh upstream try per call — under policy.
+    on_event(kind) hears "retry", "hedge", "hedge_won", "rejected" and "timeout" (the deadline cancelled
+    the attempt in flight, so it could not report its own failure). Raises CircuitOpen when the
+    breaker is open, asyncio.TimeoutError past the deadline, else the last attempt's error."""
+    emit = on_event or (lambda kind: None)
+    if breaker is not None and not breaker.allow():
+        emit("rejected")
+        raise CircuitOpen("upstream circuit open")
+    hedge = policy.hedge if hedge is None else hedge
+    deadline = time.monotonic() + policy.timeout
+    tries = 0
+    while True:
+        cm = asyncio.timeout(max(deadline - time.monotonic(), 0))
+        try:
+            async with cm:
+                return await _once(attempt, policy, latency, emit, hedge)
+        except Exception as e:
+            if cm.expired():
+                emit("timeout")
+                raise
+            tries += 1
+            if tries > policy.retries or not retryable(e) or time.monotonic() >= deadline:
+                raise
+            if breaker is not None and not breaker.allow():  # Opened by this or other callers' failures
+                raise
+            delay = random.uniform(0, min(policy.max_backoff, policy.backoff * 2 ** (tries - 1)))
+            if time.monotonic() + delay >= deadline:
+                raise
+            emit("retry")
+            await asyncio.sleep(delay)
+
+
+async def _once(attempt, policy, latency, emit, hedge):
+    start = time.monotonic()
+    after = latency.p95() if hedge and latency is not None else None
+    if after is None:
+        result = await attempt()
+    else:
+        result = await _hedged(attempt, max(after, policy.hedge_min), emit)
+    if latency is not None:
+        latency.add(time.monotonic() - start)
+    return result
+
+
+async def _hedged(attempt, after, emit):
+    """attempt(); if it hasn't answered after `after` seconds, race a second one against it"""
+    first = asyncio.ensure_future(attempt())
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=after)
+        if done:
+            return first.result()
+        emit("hedge")
+        second = asyncio.ensure_future(attempt())
+        tasks.add(second)
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        emit("hedge_won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,247 @@
+"""
+MAUZER AI — Conversation sessions
+Server-side chat history per session_id: compact tuples in memory, optional SQLite persistence,
+one asyncio lock per session, token-budgeted trimming that drops old screenshots first.
+With shared=True several worker processes use one database: a turn also holds a lease row there, so
+turns of one session on different workers run one after another, and a cached session is reloaded
+when another process saved a newer version.
+"""
+import asyncio
+import contextlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+IMAGE_TOKENS = 85  # detail=low costs a flat 85 tokens per image
+MESSAGE_OVERHEAD = 4
+LEASE_POLL = 0.02  # Seconds between tries for a session another worker holds
+
+# Message = (role, content, image, tool_calls, tool_call_id)
+#   image: (mime, base64) or None, tool_calls: compact JSON string or None
+ROLES = {r: sys.intern(r) for r in ("user", "assistant", "tool")}
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~3 chars per token for mixed Russian/English)"""
+    return len(text) // 3 + 1 if text else 0
+
+
+def message_tokens(msg):
+    role, content, image, tool_calls, _ = msg
+    return (MESSAGE_OVERHEAD + estimate_tokens(content) + estimate_tokens(tool_calls)
+            + (IMAGE_TOKENS if image else 0))
+
+
+def to_openai(msg):
+    """Compact tuple -> OpenAI chat message dict"""
+    role, content, image, tool_calls, tool_call_id = msg
+    if image:
+        mime, b64 = image
+        out = {"role": role, "content": [
+            {"type": "text", "text": content},
+            {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{b64}", "detail": "low"}},
+        ]}
+    else:
+        out = {"role": role, "content": content}
+    if tool_calls:
+        out["tool_calls"] = json.loads(tool_calls)
+    if tool_call_id:
+        out["tool_call_id"] = tool_call_id
+    return out
+
+
+class Session:
+    __slots__ = ("id", "turns", "tokens", "touched", "version", "_lock")
+
+    def __init__(self, session_id, turns=None, version=None):
+        self.id = session_id
+        self.turns = turns or []  # [[msg, ...], ...] — one list per user turn, trimmed together
+        self.tokens = sum(message_tokens(m) for turn in self.turns for m in turn)
+        self.touched = time.time()
+        self.version = version  # "updated" of the saved row this copy matches (None: never saved)
+        self._lock = None
+
+    @property
+    def lock(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def messages(self):
+        return [to_openai(m) for turn in self.turns for m in turn]
+
+
+class SessionStore:
+    def __init__(self, token_budget=3000, max_sessions=10000, db_path=None, max_images=2, shared=False,
+                 lease=120.0, ttl=None):
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        self.max_images = max_images  # Screenshots kept in history (older pages are stale anyway)
+        self.sessions = OrderedDict()  # session_id -> Session, least recently used first
+        self.db = None
+        self.db_lock = threading.Lock()
+        self.shared = bool(shared and db_path)  # Other processes write the same database
+        self.lease = lease  # Seconds before a turn's lease is taken over (its worker died mid-turn)
+        self.ttl = ttl  # Saved sessions untouched this long are purged (None: kept)
+        self.reloads = 0
+        self.lease_waits = 0
+        if db_path:
+            self.db = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, turns TEXT, updated REAL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS leases (id TEXT PRIMARY KEY, owner TEXT, expires REAL)")
+            self.db.commit()
+
+    async def get(self, session_id):
+        """The session — read from the database (off the event loop) when this process has no copy"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            turns, version = await asyncio.to_thread(self._load, session_id) if self.db is not None else ([], None)
+            session = self.sessions.get(session_id)  # A concurrent request may have loaded it meanwhile
+            if session is None:
+                session = Session(session_id, turns, version)
+                self.sessions[session_id] = session
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(session_id)
+        session.touched = time.time()
+        return session
+
+    @contextlib.asynccontextmanager
+    async def locked(self, session_id):
+        """The session, held for one turn. shared=True: also the session's lease in the database (a
+        turn on another worker waits for it), and the history reloaded if another worker saved since"""
+        session = await self.get(session_id)
+        async with session.lock:
+            if not self.shared:
+                yield session
+                return
+            owner = uuid.uuid4().hex
+            if not await asyncio.to_thread(self._take_lease, session_id, owner):
+                self.lease_waits += 1
+                while not await asyncio.to_thread(self._take_lease, session_id, owner):
+                    await asyncio.sleep(LEASE_POLL)
+            try:
+                if await asyncio.to_thread(self._version, session_id) != session.version:
+                    await asyncio.to_thread(self.refresh, session)
+                yield session
+            finally:
+                await asyncio.to_thread(self._release_lease, session_id, owner)
+
+    async def drop(self, session_id):
+        self.sessions.pop(session_id, None)
+        if self.db is not None:
+            await asyncio.to_thread(self._delete, session_id)
+
+    def append(self, session, turn):
+        """Add one turn (list of messages) and trim to the token budget"""
+        session.turns.append([])
+        self.extend(session, turn)
+
+    def extend(self, session, messages):
+        """Add messages to the newest turn (e.g. tool results for its tool calls) and trim"""
+        messages = [(ROLES[role], content, image, tool_calls, tool_call_id)
+                    for role, content, image, tool_calls, tool_call_id in messages]
+        session.turns[-1].extend(messages)
+        session.tokens += sum(message_tokens(m) for m in messages)
+        self.trim(session)
+
+    def trim(self, session):
+        """Strip screenshots beyond max_images; over budget: strip more screenshots oldest-first
+        (keeping the newest turn's), then drop oldest turns"""
+        images = sum(1 for turn in session.turns for m in turn if m[2] is not None)
+        for turn in session.turns[:-1]:
+            if images <= self.max_images and session.tokens <= self.token_budget:
+                break
+            for i, msg in enumerate(turn):
+                if msg[2] is not None:
+                    images -= 1
+                    session.tokens -= IMAGE_TOKENS
+                    turn[i] = msg[:2] + (None,) + msg[3:]
+        while session.tokens > self.token_budget and len(session.turns) > 1:
+            dropped = session.turns.pop(0)
+            session.tokens -= sum(message_tokens(m) for m in dropped)
+
+    def refresh(self, session):
+        """Replace a cached session's history with the saved one (another worker changed it).
+        The Session object — and so its lock — stays the same."""
+        session.turns, session.version = self._load(session.id)
+        session.tokens = sum(message_tokens(m) for turn in session.turns for m in turn)
+        self.reloads += 1
+
+    # ---------- SQLite persistence (screenshots are not persisted) ----------
+    def _load(self, session_id):
+        """(turns, version) of the saved session, ([], None) if there is none"""
+        if self.db is None:
+            return [], None
+        with self.db_lock:
+            row = self.db.execute("SELECT turns, updated FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if not row:
+            return [], None
+        return [[(ROLES[m[0]], m[1], None, m[2], m[3]) for m in turn] for turn in json.loads(row[0])], row[1]
+
+    def _delete(self, session_id):
+        with self.db_lock:
+            self.db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self.db.commit()
+
+    def _take_lease(self, session_id, owner):
+        """Lease the session if it is free or its holder's lease ran out -> True"""
+        now = time.time()
+        with self.db_lock:
+            taken = self.db.execute(
+                "INSERT INTO leases VALUES (?, ?, ?) ON CONFLICT (id) DO UPDATE SET owner = excluded.owner, "
+                "expires = excluded.expires WHERE leases.expires < ?", (session_id, owner, now + self.lease, now)
+            ).rowcount
+            self.db.commit()
+        return taken > 0
+
+    def _release_lease(self, session_id, owner):
+        with self.db_lock:
+            self.db.execute("DELETE FROM leases WHERE id = ? AND owner = ?", (session_id, owner))
+            self.db.commit()
+
+    def _version(self, session_id):
+        with self.db_lock:
+            row = self.db.execute("SELECT updated FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, session):
+        """Persist a session (blocking — run off the event loop)"""
+        if self.db is None:
+            return
+        turns = [[(m[0], m[1], m[3], m[4]) for m in turn] for turn in session.turns]
+        data = json.dumps(turns, ensure_ascii=False, separators=(",", ":"))
+        version = time.time()
+        with self.db_lock:
+            self.db.execute("INSERT OR REPLACE INTO sessions (id, turns, updated) VALUES (?, ?, ?)",
+                            (session.id, data, version))
+            self.db.commit()
+        session.version = version
+
+    def purge(self):
+        """Delete saved sessions older than ttl and leases left by dead workers (blocking — run off
+        the event loop)"""
+        if self.db is None:
+            return
+        now = time.time()
+        with self.db_lock:
+            if self.ttl:
+                self.db.execute("DELETE FROM sessions WHERE updated < ?", (now - self.ttl,))
+            self.db.execute("DELETE FROM leases WHERE expires < ?", (now,))
+            self.db.commit()
+
+    def stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "persistent": self.db is not None,
+            "shared": self.shared,
+            "reloads": self.reloads,
+            "lease_waits": self.lease_waits,
+            "token_budget": self.token_budget,
+        }
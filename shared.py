@@ -0,0 +1,108 @@
+"""
+MAUZER AI — State shared between worker processes
+One SQLite file in WAL mode that every worker opens: namespaced key/value entries with expiry,
+windowed counters and append-only event logs. WAL lets readers run while one process writes;
+synchronous=NORMAL skips the fsync per commit (a crash may lose the last moments of cache, never
+corrupt it). Calls are blocking and may wait up to busy_timeout on another worker's write lock —
+callers run them through asyncio.to_thread.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class SharedStore:
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()  # One connection per process, used from the loop and worker threads
+        self.db = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS kv (ns TEXT, key TEXT, value TEXT, expires REAL, "
+                        "PRIMARY KEY (ns, key))")
+        self.db.execute("CREATE TABLE IF NOT EXISTS counters (ns TEXT, key TEXT, count INTEGER, expires REAL, "
+                        "PRIMARY KEY (ns, key))")
+        self.db.execute("CREATE TABLE IF NOT EXISTS log (ns TEXT, key TEXT, seq INTEGER, value TEXT, expires REAL, "
+                        "PRIMARY KEY (ns, key, seq))")
+
+    # ---------- key/value ----------
+    def get(self, ns, key):
+        """JSON-decoded value, or None when missing or expired"""
+        with self.lock:
+            row = self.db.execute("SELECT value, expires FROM kv WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def put(self, ns, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?)", (ns, key, data, expires))
+
+    def delete(self, ns, key):
+        with self.lock:
+            self.db.execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, key))
+
+    # ---------- counters ----------
+    def incr(self, ns, key, amount=1, ttl=None):
+        """Add to a counter that resets ttl seconds after its first increment; returns the new count"""
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute("SELECT count, expires FROM counters WHERE ns = ? AND key = ?",
+                                      (ns, key)).fetchone()
+                if row is None or (row[1] is not None and row[1] < now):
+                    count, expires = amount, now + ttl if ttl else None
+                else:
+                    count, expires = row[0] + amount, row[1]
+                self.db.execute("INSERT OR REPLACE INTO counters VALUES (?, ?, ?, ?)", (ns, key, count, expires))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return count
+
+    # ---------- event logs ----------
+    def append(self, ns, key, value, ttl=600):
+        """Append to the key's log (sequence numbers from 1)"""
+        self.extend(ns, key, [value], ttl)
+
+    def extend(self, ns, key, values, ttl=600):
+        """Append several values to the key's log in one transaction"""
+        expires = time.time() + ttl
+        rows = [(ns, key, json.dumps(value, ensure_ascii=False, separators=(",", ":")), expires, ns, key)
+                for value in values]
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.executemany("INSERT INTO log SELECT ?, ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM log "
+                                    "WHERE ns = ? AND key = ?", rows)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def read(self, ns, key, after=0):
+        """[(seq, value)] appended after seq `after`"""
+        with self.lock:
+            rows = self.db.execute("SELECT seq, value FROM log WHERE ns = ? AND key = ? AND seq > ? ORDER BY seq",
+                                   (ns, key, after)).fetchall()
+        return [(seq, json.loads(value)) for seq, value in rows]
+
+    def purge(self):
+        """Drop expired rows (blocking — run off the event loop)"""
+        now = time.time()
+        with self.lock:
+            for table in ("kv", "counters", "log"):
+                self.db.execute(f"DELETE FROM {table} WHERE expires IS NOT NULL AND expires < ?", (now,))
+
+    def stats(self):
+        with self.lock:
+            counts = {table: self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in ("kv", "counters", "log")}
+        return {"path": self.path, **counts}
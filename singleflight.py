@@ -0,0 +1,104 @@
+"""
+MAUZER AI — Request coalescing
+Identical requests that arrive while one is already in flight (browser retries, several tabs asking
+for the same phrase) wait for that call instead of making their own. SingleFlight shares a result;
+Broadcast shares a stream, replaying chunks already sent to late joiners.
+"""
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        self.flights = {}  # key -> task of the call in progress
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    async def do(self, key, fn):
+        """await fn() once per key at a time — concurrent callers with the same key share the result.
+        The call runs in its own task, so a caller that disconnects doesn't cancel it for the others."""
+        task = self.flights.get(key)
+        if task is None:
+            self.stats["calls"] += 1
+            task = self.flights[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._landed(key, t))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _landed(self, key, task):
+        self.flights.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Retrieved even if every waiter went away — no "never retrieved" warning
+
+    def report(self):
+        return {**self.stats, "in_flight": len(self.flights)}
+
+
+class StreamFlights:
+    """SingleFlight for streamed responses: one producer per key fills a Broadcast that every caller reads"""
+
+    def __init__(self):
+        self.flights = {}  # key -> Broadcast being filled
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def join(self, key, produce):
+        """Broadcast for key, starting `await produce(broadcast)` in the background if none is in flight.
+        produce pushes chunks and closes the broadcast; it stays joinable until produce returns."""
+        flight = self.flights.get(key)
+        if flight is None:
+            self.stats["calls"] += 1
+            flight = self.flights[key] = Broadcast()
+            flight.producer = asyncio.ensure_future(self._run(key, flight, produce))
+        else:
+            self.stats["coalesced"] += 1
+        return flight
+
+    async def _run(self, key, flight, produce):
+        try:
+            await produce(flight)
+        except Exception as e:
+            flight.close(e)
+        finally:
+            if not flight.done:
+                flight.close()
+            self.flights.pop(key, None)
+
+    def report(self):
+        return {**self.stats, "in_flight": len(self.flights)}
+
+
+class Broadcast:
+    """One producer's chunks, readable by any number of consumers (late joiners get the backlog first)"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.ready = asyncio.Event()  # First chunk arrived, or the producer finished/failed
+        self.producer = None  # Task filling it (referenced here so it isn't garbage collected)
+        self.changed = asyncio.Event()
+
+    def push(self, chunk):
+        self.chunks.append(chunk)
+        self._wake()
+
+    def close(self, error=None):
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self):
+        self.ready.set()
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def read(self):
+        i = 0
+        while True:
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self.changed.wait()
@@ -0,0 +1,119 @@
+"""
+MAUZER AI — Fast startup
+The browser launches the backend on demand, so every second of cold start delays the first voice
+command. Heavy dependencies (the OpenAI SDK, edge-tts, torch/transformers) are bound with lazy():
+a stand-in that imports the real module on first attribute access, so the server binds before
+they load and a background task finishes the imports while the user is still speaking.
+The timeline records when each phase ended, for /health and the startup bench.
+"""
+import importlib
+import importlib.util
+import os
+import threading
+import time
+
+STARTED = time.perf_counter()  # First backend module imported — the interpreter itself isn't counted
+FAST_START = os.environ.get("MAUZER_FAST_START", "1") != "0"  # 0: import everything up front, as before
+
+deferred = {}  # name -> LazyModule, in order of declaration
+loaded = {}  # name -> {"seconds": import time, "at": seconds since start when it finished, "thread": ...}
+
+
+class LazyModule:
+    """Module proxy: the first attribute access imports `name` (once, from any thread)"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.RLock()
+
+    def _load(self):
+        module = self._module
+        if module is not None:
+            return module
+        with self._lock:  # A second thread waits for the first one's import instead of timing its own
+            module = self._module
+            if module is None:
+                start = time.perf_counter()
+                module = importlib.import_module(self._name)
+                done = time.perf_counter()
+                loaded[self._name] = {"seconds": round(done - start, 3), "at": round(done - STARTED, 3),
+                                      "thread": threading.current_thread().name}
+                self._module = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "deferred"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy(name, required=False):
+    """The module `name`, imported on first use — or None when it isn't installed (required: raise
+    ModuleNotFoundError now). With MAUZER_FAST_START=0 the import happens here, as a plain import would."""
+    if not FAST_START:
+        try:
+            return importlib.import_module(name)
+        except ImportError:
+            if required:
+                raise
+            return None
+    try:
+        found = importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        found = False
+    if not found:
+        if required:
+            raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+        return None
+    if name not in deferred:  # One proxy per module, however many modules bind it
+        deferred[name] = LazyModule(name)
+    return deferred[name]
+
+
+def load(*names):
+    """Import the deferred modules among names now (blocking — run it off the event loop)"""
+    for name in names:
+        module = deferred.get(name)
+        if module is not None:
+            module._load()
+
+
+# ============================================================
+# TIMELINE
+# ============================================================
+marks = {}  # phase -> seconds since STARTED
+
+
+def mark(phase):
+    """Record the end of a startup phase (only the first time it happens)"""
+    marks.setdefault(phase, round(time.perf_counter() - STARTED, 3))
+
+
+def report():
+    return {
+        "fast_start": FAST_START,
+        "timeline_s": dict(marks),
+        "deferred_imports": {name: loaded.get(name, "not loaded") for name in deferred},
+    }
+
+
+class FirstResponseMiddleware:
+    """Marks "first_response" when the first request outside `exempt` starts its reply"""
+
+    def __init__(self, app, exempt=()):
+        self.app = app
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if "first_response" in marks or scope["type"] != "http" or scope["path"].startswith(self.exempt):
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                mark("first_response")
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,165 @@
+"""
+MAUZER AI — TTS audio cache
+Content-addressed: key = sha256(text, model, voice, format).
+Two tiers: in-memory LRU for hot clips, on-disk LRU with a byte budget.
+shared=True: other processes write the same directory — a miss checks for their file before giving up.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class TTSCache:
+    def __init__(self, directory, disk_budget, memory_budget, max_memory_item=None, shared=False):
+        self.directory = directory
+        self.shared = shared
+        self.disk_budget = disk_budget
+        self.memory_budget = memory_budget
+        self.max_memory_item = max_memory_item or memory_budget // 4
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()  # key -> bytes
+        self.memory_bytes = 0
+        self.disk = OrderedDict()  # key -> size (oldest first)
+        self.disk_bytes = 0
+        self.counters = {
+            "hits_memory": 0,
+            "hits_disk": 0,
+            "misses": 0,
+            "evictions_memory": 0,
+            "evictions_disk": 0,
+        }
+        if disk_budget > 0:  # 0 = memory-only cache
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+
+    @staticmethod
+    def key(text, model, voice, fmt):
+        raw = "\x00".join((model, voice, fmt, text)).encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _scan(self):
+        """Pick up clips left by a previous run, least recently used first"""
+        entries = []
+        for name in os.listdir(self.directory):
+            full = os.path.join(self.directory, name)
+            if len(name) != 64 or not os.path.isfile(full):
+                continue
+            st = os.stat(full)
+            entries.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self.disk[name] = size
+            self.disk_bytes += size
+        self._evict_disk()
+
+    # ---------- lookups ----------
+    def get(self, key):
+        """Memory hit -> bytes, disk hit -> file path, miss -> None"""
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                self.counters["hits_memory"] += 1
+                return data
+            if key in self.disk:
+                self.disk.move_to_end(key)
+                self.counters["hits_disk"] += 1
+                return self.path(key)
+        if self.shared and self.disk_budget:
+            try:
+                size = os.stat(self.path(key)).st_size  # Written by another worker
+            except OSError:
+                size = None
+            if size is not None:
+                with self.lock:
+                    self.disk_bytes += size - self.disk.get(key, 0)
+                    self.disk[key] = size
+                    self.counters["hits_disk"] += 1
+                    self._evict_disk()
+                return self.path(key)
+        with self.lock:
+            self.counters["misses"] += 1
+        return None
+
+    def read(self, key):
+        """Bytes for a key from either tier (disk hits are promoted to memory)"""
+        hit = self.get(key)
+        if hit is None or isinstance(hit, bytes):
+            return hit
+        try:
+            with open(hit, "rb") as f:
+                data = f.read()
+        except OSError:
+            self._forget(key)
+            return None
+        self._remember(key, data)
+        return data
+
+    # ---------- inserts ----------
+    def put(self, key, data):
+        """Store a clip in both tiers (blocking disk write — run off the event loop)"""
+        if not data:
+            return
+        self._remember(key, data)
+        if not self.disk_budget or len(data) > self.disk_budget:
+            return
+        tmp = self.path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"  # Unique across worker processes
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self.path(key))
+        except OSError as e:
+            print(f"[TTS CACHE] Disk write failed: {e}")
+            return
+        with self.lock:
+            self.disk_bytes += len(data) - self.disk.get(key, 0)
+            self.disk[key] = len(data)
+            self.disk.move_to_end(key)
+            self._evict_disk()
+
+    def _remember(self, key, data):
+        if len(data) > self.max_memory_item:
+            return
+        with self.lock:
+            old = self.memory.pop(key, None)
+            if old is not None:
+                self.memory_bytes -= len(old)
+            self.memory[key] = data
+            self.memory_bytes += len(data)
+            while self.memory_bytes > self.memory_budget:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_bytes -= len(evicted)
+                self.counters["evictions_memory"] += 1
+
+    def _evict_disk(self):
+        while self.disk_bytes > self.disk_budget:
+            key, size = self.disk.popitem(last=False)
+            self.disk_bytes -= size
+            self.counters["evictions_disk"] += 1
+            try:
+                os.unlink(self.path(key))
+            except OSError:
+                pass
+
+    def _forget(self, key):
+        with self.lock:
+            size = self.disk.pop(key, None)
+            if size is not None:
+                self.disk_bytes -= size
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits_memory"] + self.counters["hits_disk"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self.disk),
+                "disk_bytes": self.disk_bytes,
+                "disk_budget": self.disk_budget,
+            }
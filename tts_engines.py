@@ -0,0 +1,185 @@
+"""
+MAUZER AI — TTS engines
+OpenAI (tts-1), Edge (free Microsoft neural voices) and an offline engine for tests behind one
+interface: synthesize(text, fmt) -> audio bytes, stream(text, fmt) -> audio chunks. Long texts are
+split into sentences, synthesized in parallel on a bounded pool and streamed back in order — MP3
+clips concatenate frame by frame into one playable stream.
+"""
+import asyncio
+import io
+import re
+from contextlib import AsyncExitStack
+
+import numpy as np
+
+from startup import lazy
+
+edge_tts = lazy("edge_tts")  # Imported on first Edge synthesis; None when edge-tts is missing -> OpenAI/local only
+
+try:
+    import soundfile
+except ImportError:  # soundfile missing -> no local engine
+    soundfile = None
+
+SENTENCE_END = re.compile(r"[.!?…]+[\"»)]*\s+|\n+")
+MIN_SENTENCE_CHARS = 12  # Shorter fragments are merged into the next sentence
+
+
+def pop_sentences(buffer):
+    """Split finished sentences off the front of buffer, return (sentences, rest)"""
+    sentences = []
+    start = 0
+    for m in SENTENCE_END.finditer(buffer):
+        sentence = buffer[start:m.end()].strip()
+        if len(sentence) >= MIN_SENTENCE_CHARS:
+            sentences.append(sentence)
+            start = m.end()
+    return sentences, buffer[start:]
+
+
+def split_sentences(text):
+    """Whole text -> sentences (a short tail joins the last one)"""
+    sentences, rest = pop_sentences(text)
+    rest = rest.strip()
+    if rest and sentences and len(rest) < MIN_SENTENCE_CHARS:
+        sentences[-1] += " " + rest
+    elif rest:
+        sentences.append(rest)
+    return sentences
+
+
+async def in_order(items, fn, workers):
+    """await fn(item) for every item, at most `workers` at a time, yielding results in item order"""
+    slots = asyncio.Semaphore(workers)
+
+    async def one(item):
+        async with slots:
+            return await fn(item)
+
+    tasks = [asyncio.ensure_future(one(item)) for item in items]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _direct_call(op, make):
+    return await make()
+
+
+async def _direct_open(op, make):
+    stack = AsyncExitStack()
+    return stack, await make(stack)
+
+
+# ============================================================
+# ENGINES
+# ============================================================
+class OpenAITTS:
+    name = "openai"
+    formats = ("mp3", "opus")
+
+    def __init__(self, speech, model="tts-1", voice="onyx", timeout=20.0, call=None, open_stream=None):
+        self.speech = speech  # () -> client.audio.speech
+        self.model = model
+        self.voice = voice
+        self.timeout = timeout
+        self.call = call or _direct_call  # call(op, make) / open_stream(op, make): the upstream wrappers
+        self.open_stream = open_stream or _direct_open
+
+    @property
+    def cache_id(self):
+        return self.model, self.voice
+
+    async def synthesize(self, text, fmt="mp3"):
+        response = await self.call("tts", lambda: self.speech().create(
+            model=self.model, voice=self.voice, input=text, response_format=fmt, timeout=self.timeout))
+        return response.content
+
+    async def stream(self, text, fmt="mp3"):
+        stack, response = await self.open_stream("tts", lambda stack: stack.enter_async_context(
+            self.speech().with_streaming_response.create(
+                model=self.model, voice=self.voice, input=text, response_format=fmt, timeout=self.timeout)))
+        async with stack:
+            async for chunk in response.iter_bytes():
+                yield chunk
+
+
+class EdgeTTS:
+    name = "edge"
+    formats = ("mp3",)  # 24 kHz mono MP3
+
+    def __init__(self, voice="ru-RU-DmitryNeural", rate="+0%", call=None, open_stream=None):
+        self.voice = voice
+        self.rate = rate
+        self.call = call or _direct_call
+        self.open_stream = open_stream or _direct_open
+
+    @property
+    def cache_id(self):
+        return "edge", self.voice
+
+    async def _audio(self, text):
+        if edge_tts is None:
+            raise RuntimeError("Edge TTS needs edge-tts (pip install -r requirements.txt)")
+        async for chunk in edge_tts.Communicate(text, self.voice, rate=self.rate).stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+    async def synthesize(self, text, fmt="mp3"):
+        async def collect():
+            return b"".join([chunk async for chunk in self._audio(text)])
+        return await self.call("tts", collect)
+
+    async def stream(self, text, fmt="mp3"):
+        async def start(stack):
+            chunks = self._audio(text)
+            stack.push_async_callback(chunks.aclose)
+            return await anext(chunks, b""), chunks  # Connect + first audio inside the retry window
+
+        stack, (first, chunks) = await self.open_stream("tts", start)
+        async with stack:
+            if first:
+                yield first
+            async for chunk in chunks:
+                yield chunk
+
+
+class LocalTTS:
+    """Offline engine for tests and benchmarks: a deterministic tone per character, really encoded
+    to MP3 / Ogg-Opus, after a simulated synthesis time that grows with the text like a real engine's"""
+    name = "local"
+    formats = ("mp3", "opus")
+    cache_id = ("local", "tones")
+
+    def __init__(self, latency=0.05, per_char=0.002, rate=16000, chars_per_second=14):
+        self.latency = latency
+        self.per_char = per_char
+        self.rate = rate
+        self.chars_per_second = chars_per_second
+
+    async def synthesize(self, text, fmt="mp3"):
+        if soundfile is None:
+            raise RuntimeError("Local TTS needs soundfile (pip install -r requirements.txt)")
+        await asyncio.sleep(self.latency + self.per_char * len(text))
+        return await asyncio.to_thread(self.render, text, fmt)
+
+    async def stream(self, text, fmt="mp3"):
+        yield await self.synthesize(text, fmt)
+
+    def render(self, text, fmt="mp3"):
+        n = self.rate // self.chars_per_second
+        t = np.arange(n) / self.rate
+        envelope = np.hanning(n)
+        parts = [np.zeros(n, dtype=np.float32) if ch.isspace()
+                 else (0.3 * envelope * np.sin(2 * np.pi * (180 + 12 * (ord(ch) % 32)) * t)).astype(np.float32)
+                 for ch in text]
+        samples = np.concatenate(parts) if parts else np.zeros(n, dtype=np.float32)
+        buf = io.BytesIO()
+        if fmt == "opus":
+            soundfile.write(buf, samples, self.rate, format="OGG", subtype="OPUS")
+        else:
+            soundfile.write(buf, samples, self.rate, format="MP3", subtype="MPEG_LAYER_III")
+        return buf.getvalue()
@@ -0,0 +1,120 @@
+"""
+MAUZER AI — Voice activity detection
+Energy-based VAD over 16-bit mono PCM: adaptive noise floor, speech onset after a few voiced
+frames, end of utterance after a silence hangover. A short pause inside speech is reported
+early so the caller can start transcribing before the utterance is confirmed over.
+"""
+import io
+import wave
+from collections import deque
+
+import numpy as np
+
+SAMPLE_WIDTH = 2  # 16-bit PCM
+
+
+def pcm_to_wav(pcm, sample_rate):
+    """Raw 16-bit mono PCM -> WAV bytes (in memory)"""
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(SAMPLE_WIDTH)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return out.getvalue()
+
+
+def frame_db(frame):
+    """RMS level of one PCM frame in dBFS"""
+    samples = np.frombuffer(frame, dtype="<i2").astype(np.float32)
+    rms = np.sqrt(np.mean(samples * samples)) if len(samples) else 0.0
+    return 20 * np.log10(max(rms, 1.0) / 32768)
+
+
+class VoiceActivityDetector:
+    """feed(pcm) -> [(event, pcm)] with events:
+        "start" — speech began (pcm is None)
+        "pause" — silence after speech; pcm = the utterance so far (speculative end)
+        "end"   — utterance over; pcm = the whole utterance
+        "drop"  — too short to be speech (a click or cough), nothing to transcribe
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=20, onset_ms=60, pause_ms=160, hangover_ms=480,
+                 preroll_ms=200, min_speech_ms=250, max_utterance_s=30, threshold_db=12.0, floor_db=-50.0):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * SAMPLE_WIDTH
+        self.onset = max(1, onset_ms // frame_ms)
+        self.pause = max(1, pause_ms // frame_ms)
+        self.hangover = max(self.pause + 1, hangover_ms // frame_ms)
+        self.min_speech = min_speech_ms // frame_ms
+        self.max_frames = max_utterance_s * 1000 // frame_ms
+        self.threshold_db = threshold_db  # Above the noise floor to count as voiced
+        self.floor_db = floor_db  # Never voiced below this, however quiet the room
+        self.noise_db = -60.0
+        self.pending = b""
+        self.preroll = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self.reset()
+
+    def reset(self):
+        self.speaking = False
+        self.frames = []  # Utterance frames (preroll included)
+        self.voiced_run = 0
+        self.silent_run = 0
+        self.voiced_total = 0
+        self.speech_end = 0  # Frames up to the last voiced one
+
+    def feed(self, pcm):
+        events = []
+        data = self.pending + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self.pending = data[usable:]
+        for i in range(0, usable, self.frame_bytes):
+            event = self._frame(data[i:i + self.frame_bytes])
+            if event:
+                events.append(event)
+        return events
+
+    def flush(self):
+        """Force the end of the current utterance (client stopped sending)"""
+        if not self.speaking:
+            self.reset()
+            return None
+        return self._finish()
+
+    def _frame(self, frame):
+        db = frame_db(frame)
+        voiced = db > max(self.noise_db + self.threshold_db, self.floor_db)
+        if not voiced:  # Track the room: fast down, slow up
+            self.noise_db = db if db < self.noise_db else 0.95 * self.noise_db + 0.05 * db
+
+        if not self.speaking:
+            self.preroll.append(frame)
+            self.voiced_run = self.voiced_run + 1 if voiced else 0
+            if self.voiced_run >= self.onset:
+                self.speaking = True
+                self.frames = list(self.preroll)
+                self.preroll.clear()
+                self.voiced_total = self.voiced_run
+                self.speech_end = len(self.frames)
+                return ("start", None)
+            return None
+
+        self.frames.append(frame)
+        if voiced:
+            self.voiced_total += 1
+            self.silent_run = 0
+            self.speech_end = len(self.frames)
+        else:
+            self.silent_run += 1
+            if self.silent_run == self.pause:
+                return ("pause", b"".join(self.frames[:self.speech_end]))
+        if self.silent_run >= self.hangover or len(self.frames) >= self.max_frames:
+            return self._finish()
+        return None
+
+    def _finish(self):
+        pcm = b"".join(self.frames[:self.speech_end])
+        long_enough = self.voiced_total >= self.min_speech
+        self.reset()
+        return ("end", pcm) if long_enough else ("drop", None)
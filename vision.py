@@ -0,0 +1,115 @@
+"""
+MAUZER AI — Vision preprocessing
+Screenshots are decoded once, downscaled to what detail=low actually looks at (512 px),
+re-encoded as JPEG/WebP. A frame byte-for-byte identical to a recent one reuses its encode; a
+frame that merely looks similar is always encoded and sent — a changed search result or a typed
+character is exactly what the model needs to see.
+"""
+import base64
+import hashlib
+import io
+import threading
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow missing -> screenshots pass through untouched
+    Image = None
+
+LOW_DETAIL_SIZE = 512  # detail=low: the model sees a 512x512 version anyway
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png", "GIF": "image/gif"}
+
+
+def sniff_mime(raw):
+    """MIME type from magic bytes (browsers label everything image/png)"""
+    if raw.startswith(b"\x89PNG"):
+        return "image/png"
+    if raw.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if raw[:4] == b"RIFF" and raw[8:12] == b"WEBP":
+        return "image/webp"
+    if raw.startswith(b"GIF8"):
+        return "image/gif"
+    return "image/png"
+
+
+def split_data_uri(data):
+    """'data:image/png;base64,AAAA' or bare base64 -> (mime or None, base64 payload)"""
+    if data.startswith("data:") and "," in data:
+        header, payload = data.split(",", 1)
+        return header[5:].split(";", 1)[0] or None, payload
+    if "," in data:
+        return None, data.split(",", 1)[1]
+    return None, data
+
+
+def open_frame(raw, max_side=LOW_DETAIL_SIZE):
+    img = Image.open(io.BytesIO(raw))
+    img.draft("RGB", (max_side, max_side))  # JPEG: decode at reduced scale
+    img.load()
+    return img
+
+
+def encode_frame(img, fmt="JPEG", quality=70, max_side=LOW_DETAIL_SIZE):
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    img.thumbnail((max_side, max_side), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    out = io.BytesIO()
+    img.save(out, fmt, quality=quality)
+    return out.getvalue()
+
+
+def analyze(raw, fmt="JPEG", quality=70, max_side=LOW_DETAIL_SIZE):
+    """Decode + re-encode -> encoded bytes. Pure and picklable — for a process pool."""
+    return encode_frame(open_frame(raw, max_side), fmt, quality, max_side)
+
+
+class VisionPreprocessor:
+    def __init__(self, fmt="JPEG", quality=70, max_side=LOW_DETAIL_SIZE, history=8):
+        self.fmt = fmt
+        self.quality = quality
+        self.max_side = max_side
+        self.history = history
+        self.lock = threading.Lock()
+        self.recent = []  # [(digest of the original bytes, (mime, b64))], newest last
+        self.stats = {"frames": 0, "exact_dupes": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def prepare(self, data):
+        """Screenshot (data URI, base64 str or raw bytes) -> (mime, base64, info). Blocking — run in a thread."""
+        found, raw, digest = self.lookup(data)
+        if found is not None:
+            return found
+        return self.settle(raw, digest, analyze(raw, self.fmt, self.quality, self.max_side))
+
+    # prepare() in steps, for running the decode + encode in another process:
+    #   lookup() here, analyze() in the pool, settle() here again
+    def lookup(self, data):
+        """(result, None, None) when no decode is needed (exact duplicate, no Pillow), else (None, raw, digest)"""
+        if isinstance(data, str):
+            label, payload = split_data_uri(data)
+            raw = base64.b64decode(payload)
+        else:
+            label, payload, raw = None, None, bytes(data)
+
+        if Image is None:
+            mime = label or sniff_mime(raw)
+            b64 = payload or base64.b64encode(raw).decode("ascii")
+            return (mime, b64, {"dedup": None, "in_bytes": len(raw), "out_bytes": len(raw)}), None, None
+
+        digest = hashlib.blake2b(raw, digest_size=16).digest()
+        with self.lock:
+            self.stats["frames"] += 1
+            self.stats["bytes_in"] += len(raw)
+            for d, result in reversed(self.recent):
+                if d == digest:
+                    self.stats["exact_dupes"] += 1
+                    return (result[0], result[1], {"dedup": "exact", "in_bytes": len(raw), "out_bytes": 0}), None, None
+        return None, raw, digest
+
+    def settle(self, raw, digest, encoded):
+        """Record an encoded frame -> (mime, base64, info)"""
+        result = (MIME_TYPES[self.fmt], base64.b64encode(encoded).decode("ascii"))
+        with self.lock:
+            self.stats["bytes_out"] += len(encoded)
+            self.recent.append((digest, result))
+            del self.recent[:-self.history]
+        return result[0], result[1], {"dedup": None, "in_bytes": len(raw), "out_bytes": len(encoded)}